@@ -0,0 +1,156 @@
+// 索引页的交互：论点预览懒加载、分面筛选、按需加载的全文搜索。
+// 列表页通过 <body data-root="..."> 传入站点根目录的相对路径，数据文件由 generate_index.py 生成。
+document.addEventListener('DOMContentLoaded', () => {
+    const ROOT = document.body.dataset.root || '';
+    const searchInput = document.getElementById('searchInput');
+    const resultsList = document.getElementById('resultsList');
+    const listStatus = document.getElementById('listStatus');
+    const pagination = document.querySelector('.pagination');
+    const pageListHTML = resultsList.innerHTML;
+    const pageStatusHTML = listStatus.innerHTML;
+    const jsonCache = new Map();
+
+    function loadJSON(path) {
+        if (!jsonCache.has(path)) {
+            jsonCache.set(path, fetch(ROOT + path).then(response =>
+                response.ok ? response.json() : Promise.reject(response.status)));
+        }
+        return jsonCache.get(path);
+    }
+
+    // --- 论点预览：每个列表页对应一个小 JSON，条目接近视口时才请求 ---
+    function fillPreview(li) {
+        const p = li.querySelector('.argument-preview');
+        if (!p) return;
+        loadJSON(`index_data/previews/${li.dataset.page}.json`)
+            .then(previews => { p.textContent = previews[li.dataset.href] || ''; })
+            .catch(() => {});
+    }
+
+    const observer = 'IntersectionObserver' in window ? new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                fillPreview(entry.target);
+            }
+        });
+    }, { rootMargin: '200px' }) : null;
+
+    function watchPreviews() {
+        resultsList.querySelectorAll('li[data-page]').forEach(li => observer ? observer.observe(li) : fillPreview(li));
+    }
+
+    function renderItems(items, withPreview) {
+        if (!items.length) {
+            resultsList.innerHTML = '<li>未找到匹配项。</li>';
+            return;
+        }
+        resultsList.replaceChildren(...items.map(item => {
+            const li = document.createElement('li');
+            const a = document.createElement('a');
+            a.href = ROOT + item.href;
+            a.textContent = item.display;
+            li.appendChild(a);
+            if (withPreview && item.page) {
+                li.dataset.page = item.page;
+                li.dataset.href = item.href;
+                const p = document.createElement('p');
+                p.className = 'argument-preview';
+                li.appendChild(p);
+            }
+            return li;
+        }));
+        if (withPreview) watchPreviews();
+    }
+
+    function showPage() {
+        resultsList.innerHTML = pageListHTML;
+        listStatus.innerHTML = pageStatusHTML;
+        if (pagination) pagination.hidden = false;
+        watchPreviews();
+    }
+
+    // --- 分面筛选：#facet/<类型>/<值>，每个分面值对应一个小 JSON ---
+    function applyHash() {
+        const match = location.hash.match(/^#facet\/(\w+)\/(.+)$/);
+        if (!match) {
+            showPage();
+            return;
+        }
+        const type = match[1];
+        const slug = encodeURIComponent(decodeURIComponent(match[2]));
+        loadJSON(`index_data/${type}/${slug}.json`).then(facet => {
+            searchInput.value = '';
+            if (pagination) pagination.hidden = true;
+            listStatus.textContent = `${facet.title}：${facet.label}（${facet.papers.length} 篇）`;
+            const clear = document.createElement('a');
+            clear.href = '#';
+            clear.textContent = '清除筛选';
+            listStatus.appendChild(clear);
+            renderItems(facet.papers, true);
+        }).catch(() => {
+            listStatus.textContent = '无法加载该分面。';
+        });
+    }
+    window.addEventListener('hashchange', applyHash);
+
+    // "更多…" 按需加载完整的分面值列表
+    document.querySelectorAll('.facet-more').forEach(button => {
+        button.addEventListener('click', () => {
+            loadJSON('index_data/facets.json').then(facets => {
+                const group = button.parentElement;
+                group.querySelectorAll('a').forEach(a => a.remove());
+                facets[button.dataset.type].forEach(value => {
+                    const a = document.createElement('a');
+                    a.href = `#facet/${button.dataset.type}/${encodeURIComponent(value.slug)}`;
+                    a.append(value.label + ' ');
+                    const count = document.createElement('span');
+                    count.className = 'facet-count';
+                    count.textContent = value.count;
+                    a.appendChild(count);
+                    group.insertBefore(a, button);
+                });
+                button.remove();
+            });
+        });
+    });
+
+    // --- 全文搜索：索引较大，第一次聚焦搜索框时才加载 ---
+    let searchData = null;
+    function loadSearchData() {
+        if (searchData === null) {
+            searchData = loadJSON('search_data.json').then(data => {
+                console.log('搜索索引加载成功。');
+                return data;
+            }).catch(error => {
+                console.error('无法加载搜索索引: search_data.json', error);
+                searchInput.placeholder = '搜索索引加载失败，只能搜索本页标题';
+                return Array.from(resultsList.querySelectorAll('li a')).map(a => ({
+                    display: a.textContent, href: a.getAttribute('href').slice(ROOT.length), content: ''
+                }));
+            });
+        }
+        return searchData;
+    }
+    searchInput.addEventListener('focus', loadSearchData, { once: true });
+
+    searchInput.addEventListener('input', (e) => {
+        const query = e.target.value.toLowerCase().trim();
+        if (query === '') {
+            applyHash();
+            return;
+        }
+        loadSearchData().then(data => {
+            // 索引加载期间输入可能已经变化
+            if (searchInput.value.toLowerCase().trim() !== query) return;
+            const results = data.filter(item =>
+                item.display.toLowerCase().includes(query) || item.content.includes(query));
+            if (pagination) pagination.hidden = true;
+            listStatus.textContent = `搜索到 ${results.length} 篇`;
+            // 搜索时只显示链接，不显示论点预览，以保持简洁
+            renderItems(results, false);
+        });
+    });
+
+    applyHash();
+});
@@ -0,0 +1,192 @@
+# cli.py
+"""
+paperbot / translator / 索引 / 每日摘要 的统一命令行入口。
+
+    python cli.py summarise                          # 处理 source_pdfs/ 中的全部 PDF
+    python cli.py summarise source_pdfs/xxx.pdf      # 只处理指定的 PDF
+    python cli.py translate "Leibniz and the Kabbalah.pdf" --title "莱布尼茨与卡巴拉"
+    python cli.py translate --batch
+    python cli.py translate "Leibniz and the Kabbalah.pdf" --retranslate 12 40
+    python cli.py index
+    python cli.py digest
+    python cli.py status
+    python cli.py --base-dir /path/to/site status
+
+模块顶层只导入标准库中的轻量模块；Gemini、DeepSeek(openai)、pypdf、feedparser 等
+都在对应的子命令中按需导入，index / status 不会为它们付出启动开销。
+各子命令与 job_queue 的任务执行函数共用同一套实现与路径配置。
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+DEFAULT_BASE_DIR = os.environ.get('PAPERBOT_BASE_DIR', str(REPO_DIR))
+
+
+def _pdfs(folder):
+    if not folder.is_dir():
+        return []
+    return sorted(p for p in folder.iterdir() if p.suffix.lower() == '.pdf' and not p.name.startswith('._'))
+
+
+def _open_readonly(path):
+    """以只读方式打开 SQLite 数据库；不存在时返回 None，查看状态不会顺手创建空库。"""
+    if not path.exists():
+        return None
+    import sqlite3
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+
+
+# --- 子命令 ---
+# job_queue 在导入时读取 PAPERBOT_BASE_DIR 并把 my-project/ 加入 sys.path，
+# 因此只在 main() 设置好站点根目录之后、在各子命令中导入
+def cmd_summarise(args, base_dir):
+    import job_queue
+
+    job_queue.add_path('my-project')
+    import paperbot
+
+    if not args.pdfs:
+        paperbot.main()
+        return 0
+
+    pdf_files = []
+    for pdf in args.pdfs:
+        pdf_path = Path(pdf)
+        if not pdf_path.is_absolute() and not pdf_path.exists():
+            pdf_path = base_dir / pdf_path
+        pdf_files.append(pdf_path)
+    # 与 paperbot.main() 相同的批处理：预算检查、站点导出与本批次费用报告
+    failed = paperbot.process_batch(pdf_files)
+    return 1 if failed else 0
+
+
+def cmd_translate(args, base_dir):
+    import job_queue
+
+    job_queue.add_path('translator')
+    import translator
+
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    if not api_key:
+        print("请设置 DEEPSEEK_API_KEY 环境变量")
+        return 1
+    pdf_translator = translator.PDFTranslator(api_key)
+    if args.batch:
+        pdf_translator.batch_process_pdfs()
+        return 0
+    if not args.pdf:
+        print("请指定 PDF 文件名，或使用 --batch 处理全部文件")
+        return 2
+    if args.retranslate is not None:
+        indices = [n - 1 for n in args.retranslate] or None
+        pdf_translator.retranslate_chunks(args.pdf, args.title, indices)
+        return 0
+    return 0 if pdf_translator.process_pdf_file(args.pdf, args.title) else 1
+
+
+def cmd_index(args, base_dir):
+    import job_queue
+
+    job_queue.run_index({}, None)
+    return 0
+
+
+def cmd_digest(args, base_dir):
+    import job_queue
+
+    job_queue.run_digest({}, None)
+    return 0
+
+
+def cmd_status(args, base_dir):
+    import job_queue
+    import usage_ledger
+    from paths import TRANSLATOR_DIR as translator_dir
+
+    translations = translator_dir / 'translations'
+
+    pending = _pdfs(base_dir / 'source_pdfs')
+    print(f"站点根目录: {base_dir}")
+    print(f"待生成报告的 PDF: {len(pending)} 个（已完成 {len(_pdfs(base_dir / 'finished_pdfs'))} 个）")
+    for pdf in pending[:args.limit]:
+        print(f"  - {pdf.name}")
+    if len(pending) > args.limit:
+        print(f"  ... 另有 {len(pending) - args.limit} 个")
+
+    reports = [p.stem for p in (base_dir / 'summary_htmls').glob('*.html') if not p.name.endswith('.partial.html')]
+    missing_meta = sum(1 for stem in reports if not (base_dir / 'summary_meta' / f"{stem}.json").exists())
+    print(f"报告: {len(reports)} 篇" + (f"，其中 {missing_meta} 篇缺少侧车 JSON" if missing_meta else ''))
+
+    books = _pdfs(translator_dir / 'source_pdfs')
+    untranslated = [p for p in books if not (translations / f"{p.stem}_translated.txt").exists()]
+    done = len(list(translations.glob('*_translated.txt'))) if translations.is_dir() else 0
+    print(f"待翻译的书籍: {len(untranslated)} 本（已有译文 {done} 份）")
+    for pdf in untranslated[:args.limit]:
+        print(f"  - {pdf.name}")
+
+    conn = _open_readonly(job_queue.QUEUE_PATH)
+    if conn is not None:
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        print("任务队列: " + '，'.join(f"{status} {counts.get(status, 0)}"
+                                   for status in ('queued', 'running', 'done', 'failed')))
+        conn.close()
+
+    conn = _open_readonly(usage_ledger.LEDGER_PATH)
+    if conn is not None:
+        row = conn.execute(
+            "SELECT batch_id, COUNT(*), SUM(cost_usd), MAX(created_at) FROM calls "
+            "GROUP BY batch_id ORDER BY MAX(created_at) DESC LIMIT 1"
+        ).fetchone()
+        total = conn.execute("SELECT COALESCE(SUM(cost_usd), 0) FROM calls").fetchone()[0]
+        if row:
+            batch_id, calls, cost, last = row
+            print(f"最近批次: {batch_id}（{time.strftime('%Y-%m-%d %H:%M', time.localtime(last))}）"
+                  f" {calls} 次调用 ${cost:.4f}；累计估算费用 ${total:.4f}")
+        conn.close()
+    return 0
+
+
+COMMANDS = {
+    'summarise': cmd_summarise,
+    'translate': cmd_translate,
+    'index': cmd_index,
+    'digest': cmd_digest,
+    'status': cmd_status,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="paperbot / translator / 索引 / 摘要 的统一命令行入口")
+    parser.add_argument('--base-dir', default=DEFAULT_BASE_DIR,
+                        help="站点根目录（默认取 PAPERBOT_BASE_DIR，未设置时为本仓库目录）")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    summarise = sub.add_parser('summarise', help="为 PDF 生成深度分析报告（Gemini）")
+    summarise.add_argument('pdfs', nargs='*', help="要处理的 PDF；省略时处理 source_pdfs/ 中的全部文件")
+
+    translate = sub.add_parser('translate', help="翻译书籍（DeepSeek）")
+    translate.add_argument('pdf', nargs='?', help="translator/source_pdfs/ 中的 PDF 文件名")
+    translate.add_argument('--title', help="书籍标题，默认使用文件名")
+    translate.add_argument('--batch', action='store_true', help="翻译 translator/source_pdfs/ 中的全部文件")
+    translate.add_argument('--retranslate', nargs='*', type=int, metavar='N',
+                           help="只重新翻译已有译文中的第 N 块并原地改写；不给序号时重译翻译失败的块")
+
+    sub.add_parser('index', help="重新生成首页、分页列表、分面与搜索索引")
+    sub.add_parser('digest', help="抓取 RSS 并写出每日文献摘要")
+
+    status = sub.add_parser('status', help="查看待处理的 PDF、任务队列与费用")
+    status.add_argument('--limit', type=int, default=10, help="每类最多列出的文件数")
+
+    args = parser.parse_args(argv)
+    base_dir = Path(args.base_dir).resolve()
+    # 按需导入的 paperbot / translator / usage_ledger 等模块在导入时读取这个环境变量
+    os.environ['PAPERBOT_BASE_DIR'] = str(base_dir)
+    return COMMANDS[args.command](args, base_dir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,67 @@
 # generate_index.py
+import html
+import json
 import os
 import re
+import sys
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "my-project"))
+import site_assets
 
 # --- 配置 ---
 # 1. 存放 summary html 文件的目录
 summary_dir = "summary_htmls"
 
-# 2. 生成的 index.html 的完整路径
+# 2. 报告的结构化侧车 JSON（由 paperbot 生成报告时写出，或用 my-project/report_extract.py 补写）
+meta_dir = "summary_meta"
+
+# 3. 生成的 index.html（第 1 页）与搜索索引的路径
 output_file = "index.html"
+search_file = "search_data.json"
+
+# 4. 第 2 页起的列表页，以及分面、论点预览等按需加载的小 JSON
+pages_dir = "index_pages"
+data_dir = "index_data"
+page_size = 50           # 每个列表页的论文数，页面大小不随论文总数增长
+facet_top_n = 12         # 列表页上直接显示的每类分面值个数，其余点"更多…"再加载
 
-# 3. HTML 页面标题和头部
+# 5. HTML 页面标题和头部
 page_title = "文档索引 | Xiaoqi's Archive"
 page_header = "文档索引"
 
+# 6. 理论关键词分面：(标识, 显示名称, 匹配标题与论点的正则)
+THEORY_KEYWORDS = [
+    ('assemblage', '集合体 (Assemblage)', [r'assemblag', r'集合体', r'装配']),
+    ('ant', '行动者网络 (ANT)', [r'actor[- ]network', r'\bactants?\b', r'行动者网络', r'行动元']),
+    ('more-than-human', '超越人类 / 多物种 (More-than-human)',
+     [r'more-than-human', r'multispecies', r'non-?humans?', r'多物种', r'超越人类', r'非人类']),
+    ('posthumanism', '后人类主义 (Posthumanism)', [r'posthuman', r'cyborg', r'inhuman', r'后人类', r'赛博格']),
+    ('new-materialism', '新唯物主义 (New materialism)',
+     [r'new materialism', r'vital materialism', r'vibrant matter', r'materiality', r'新唯物主义', r'物质性']),
+    ('process-relational', '过程-关系视角 (Process-relational)',
+     [r'process-relational', r'processual', r'\brelational', r'关系性', r'过程-关系', r'关系本体论']),
+    ('resilience', '韧性 (Resilience)', [r'resilien', r'韧性']),
+    ('transitions', '可持续转型 (Sustainability transitions)',
+     [r'sustainability transition', r'transformation', r'可持续转型', r'转型']),
+    ('innovation-systems', '创新系统 / AKIS', [r'\bAKIS\b', r'innovation (eco)?systems?', r'co-innovation', r'创新系统']),
+    ('digital-agriculture', '数字农业 (Digital agriculture)',
+     [r'digital', r'precision agriculture', r'smart farming', r'robot', r'数字农业', r'精准农业', r'机器人']),
+    ('affect-embodiment', '情感与具身 (Affect & embodiment)',
+     [r'\baffect(s|ive)?\b', r'embodi', r'情动', r'情感', r'具身']),
+    ('care', '关怀 (Care)', [r'\bcare\b', r'关怀']),
+    ('biopolitics', '生命政治 (Biopolitics)', [r'biopolitic', r'microbiopolitic', r'生命政治']),
+    ('phenomenology', '现象学 (Phenomenology)', [r'phenomenolog', r'现象学']),
+    ('critical-realism', '批判实在论 (Critical realism)', [r'critical realism', r'批判实在论']),
+    ('agroecology', '农业生态学 (Agroecology)', [r'agro-?ecolog', r'农业生态']),
+    ('governance', '治理 (Governance)', [r'governance', r'治理']),
+    ('knowledge', '知识政治 (Knowledge politics)',
+     [r'knowledge claims', r'tacit knowledge', r'expertise', r'地方性知识', r'默会知识', r'专业知识']),
+]
+
+# 分面类型 -> 显示名称
+FACET_TITLES = {'author': '作者', 'year': '年份', 'keyword': '理论关键词'}
+
 
 # --- 脚本主体 ---
 def parse_filename(filename):
@@ -40,9 +89,134 @@ def parse_filename(filename):
         # 如果不匹配，返回 None
         return None
 
+def load_sidecar(filename):
+    """读取报告对应的侧车 JSON，不存在或损坏时返回 None。"""
+    meta_path = os.path.join(os.getcwd(), meta_dir, os.path.splitext(filename)[0] + '.json')
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def first_author(author):
+    """文件名中的作者部分（"Carolan et al."）取第一作者姓氏作为作者分面。"""
+    name = re.sub(r'\s+et al\.?$', '', author).strip()
+    return None if not name or name == '__' else name
+
+def facet_slug(value):
+    """分面值对应的文件名：小写，非字母数字替换为连字符（保留非 ASCII 字母）。"""
+    return re.sub(r'[^\w]+', '-', value.lower()).strip('-') or '_'
+
+def match_keywords(text):
+    return [slug for slug, _, patterns in THEORY_KEYWORDS
+            if any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns)]
+
+def page_href(page_num, root):
+    return f"{root}{output_file}" if page_num == 1 else f"{root}{pages_dir}/{page_num}.html"
+
+def write_if_changed(path, content):
+    """内容未变时不重写，保持修改时间不变，预压缩副本也就不必重新生成。"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return True
+
+def remove_stale(folder, keep):
+    """删除 folder 中本次没有生成的文件（论文被删除或分面值消失后留下的旧文件）。"""
+    if not os.path.isdir(folder):
+        return 0
+    removed = 0
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path) and path not in keep and not name.endswith(site_assets.COMPRESSED_SUFFIXES):
+            os.remove(path)
+            removed += 1
+    return removed
+
+def render_facet_nav(facets, root):
+    groups = []
+    for facet_type, title in FACET_TITLES.items():
+        values = facets[facet_type]
+        if not values:
+            continue
+        links = ''.join(
+            f'<a href="{root}{output_file}#facet/{facet_type}/{quote(value["slug"])}">'
+            f'{html.escape(value["label"])} <span class="facet-count">{value["count"]}</span></a>'
+            for value in values[:facet_top_n]
+        )
+        more = (f'<button type="button" class="facet-more" data-type="{facet_type}">更多…</button>'
+                if len(values) > facet_top_n else '')
+        groups.append(f'<div class="facet-group"><strong>{title}</strong>{links}{more}</div>')
+    return '\n        '.join(groups)
+
+def render_pagination(page_num, total_pages, root):
+    """只列出首页、末页和当前页附近的页码，页面大小与总页数无关。"""
+    if total_pages <= 1:
+        return ''
+    shown = sorted({1, total_pages, *range(max(1, page_num - 2), min(total_pages, page_num + 2) + 1)})
+    parts = []
+    if page_num > 1:
+        parts.append(f'<a href="{page_href(page_num - 1, root)}">« 上一页</a>')
+    previous = 0
+    for n in shown:
+        if n - previous > 1:
+            parts.append('<span>…</span>')
+        if n == page_num:
+            parts.append(f'<span class="current">{n}</span>')
+        else:
+            parts.append(f'<a href="{page_href(n, root)}">{n}</a>')
+        previous = n
+    if page_num < total_pages:
+        parts.append(f'<a href="{page_href(page_num + 1, root)}">下一页 »</a>')
+    return f'<nav class="pagination">{"".join(parts)}</nav>'
+
+def render_listing_page(page_num, total_pages, entries, total_papers, facets, root):
+    """生成一个列表页。论点预览不内嵌，由 assets/index.js 按需从 index_data/previews/ 加载。"""
+    list_items = [
+        f'<li data-page="{page_num}" data-href="{html.escape(entry["href"])}">'
+        f'<a href="{html.escape(root + entry["href"])}">{html.escape(entry["display"], quote=False)}</a>'
+        f'<p class="argument-preview"></p></li>'
+        for entry in entries
+    ]
+    items_html = "\n        ".join(list_items)
+    return f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{page_title}{'' if page_num == 1 else f' - 第 {page_num} 页'}</title>
+    <link rel="stylesheet" href="{root}assets/index.css">
+    <script src="{root}assets/index.js" defer></script>
+</head>
+<body data-root="{root}">
+    <h1>{page_header}</h1>
+    <input type="search" id="searchInput" placeholder="搜索标题或全文内容..." aria-label="搜索文档">
+    <nav class="facets">
+        {render_facet_nav(facets, root)}
+    </nav>
+    <p id="listStatus">第 {page_num} / {total_pages} 页 · 共 {total_papers} 篇</p>
+    <ul id="resultsList">
+        {items_html}
+    </ul>
+    {render_pagination(page_num, total_pages, root)}
+</body>
+</html>
+"""
+
 def generate_index_page():
     """
-    扫描 summary_htmls 文件夹并生成一个带链接的 index.html。
+    扫描 summary_htmls 文件夹，结合 summary_meta 中的侧车 JSON，生成：
+    - index.html 与 index_pages/<n>.html：分页的论文列表（只含链接）；
+    - index_data/previews/<n>.json：每页的论点预览，浏览时按需加载；
+    - index_data/{author,year,keyword}/<值>.json 与 index_data/facets.json：作者、年份、理论关键词分面；
+    - search_data.json：全文搜索索引，第一次使用搜索框时才加载。
+    不再解析报告 HTML。
     """
     # 目标文件夹的完整路径
     summary_path = os.path.join(os.getcwd(), summary_dir)
@@ -54,12 +228,16 @@ def generate_index_page():
 
     # 获取目标文件夹下所有的 html 文件并按字母顺序排序
     try:
-        files = sorted([f for f in os.listdir(summary_path) if f.endswith('.html')])
+        # 旧版本在 summary_htmls/ 中留下的 *.partial.html 是中断的报告，不列入索引
+        files = sorted([f for f in os.listdir(summary_path)
+                        if f.endswith('.html') and not f.endswith('.partial.html')])
     except FileNotFoundError:
         print(f"错误：扫描目录 '{summary_path}' 时出错。")
         return
 
-    list_items = []
+    entries = []
+    search_entries = []
+    missing_sidecars = 0
     print(f"在 '{summary_dir}' 文件夹中找到 {len(files)} 个 HTML 文件，开始处理...")
 
     for filename in files:
@@ -71,84 +249,106 @@ def generate_index_page():
             # 格式化显示的文本
             display_text = f"{author} ({year}) {title}"
             
-            # 构建超链接的相对路径
-            # index.html 在根目录，所以链接路径是 "summary_htmls/文件名.html"
-            href = os.path.join(summary_dir, filename)
-            
-            # 生成 HTML 列表项
-            list_items.append(f'<li><a href="{href}">{display_text}</a></li>')
-            print(f"  -> 已处理: {filename}")
+            # 构建超链接的相对路径（相对站点根目录，子目录中的列表页再加前缀）
+            href = f"{summary_dir}/{filename}"
+
+            sidecar = load_sidecar(filename)
+            if sidecar is None:
+                missing_sidecars += 1
+                sidecar = {}
+
+            entries.append({
+                'display': display_text,
+                'href': href,
+                'page': len(entries) // page_size + 1,
+                'preview': sidecar.get('preview', ''),
+                'author': first_author(author),
+                'year': year,
+                'keywords': match_keywords(f"{title} {sidecar.get('title', '')} {sidecar.get('argument', '')}"),
+            })
+            search_entries.append({
+                'display': display_text,
+                'href': href,
+                'content': sidecar.get('search_text', ''),
+            })
         else:
             print(f"  -> 跳过格式不正确的文件: {filename}")
 
-    # --- 生成完整的 HTML 内容 ---
-    html_content = f"""<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{page_title}</title>
-    <style>
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
-            line-height: 1.6;
-            margin: 0 auto;
-            max-width: 800px;
-            padding: 2em;
-            color: #333;
-            background-color: #fdfdfd;
-        }}
-        h1 {{
-            text-align: center;
-            color: #2c3e50;
-            border-bottom: 2px solid #eaecef;
-            padding-bottom: 0.5em;
-        }}
-        ul {{
-            list-style-type: none;
-            padding: 0;
-        }}
-        li {{
-            margin-bottom: 0.9em;
-            border-left: 3px solid #3498db;
-            padding-left: 1.2em;
-            transition: background-color 0.2s ease-in-out, border-left-color 0.2s ease-in-out;
-        }}
-        li:hover {{
-             background-color: #f4f6f7;
-             border-left-color: #e74c3c;
-        }}
-        a {{
-            text-decoration: none;
-            color: #2980b9;
-            font-size: 1.1em;
-            font-weight: 500;
-        }}
-        a:hover {{
-            text-decoration: underline;
-            color: #c0392b;
-        }}
-    </style>
-</head>
-<body>
+    if missing_sidecars:
+        print(f"\n提示：有 {missing_sidecars} 个报告缺少侧车 JSON，可运行 my-project/report_extract.py 补写。")
 
-    <h1>{page_header}</h1>
+    # --- 分面：值 -> 论文列表 ---
+    keyword_labels = {slug: label for slug, label, _ in THEORY_KEYWORDS}
+    keyword_slugs = {label: slug for slug, label in keyword_labels.items()}
+    grouped = {facet_type: {} for facet_type in FACET_TITLES}
+    for entry in entries:
+        values = {
+            'author': [entry['author']] if entry['author'] else [],
+            'year': [entry['year']],
+            'keyword': [keyword_labels[slug] for slug in entry['keywords']],
+        }
+        for facet_type, labels in values.items():
+            for label in labels:
+                grouped[facet_type].setdefault(label, []).append(entry)
 
-    <ul>
-        {"\n        ".join(list_items)}
-    </ul>
+    facets = {}
+    written = set()
+    for facet_type, by_label in grouped.items():
+        values = []
+        for label, papers in by_label.items():
+            slug = keyword_slugs[label] if facet_type == 'keyword' else facet_slug(label)
+            values.append({'slug': slug, 'label': label, 'count': len(papers)})
+            path = os.path.join(data_dir, facet_type, f"{slug}.json")
+            write_if_changed(path, json.dumps({
+                'type': facet_type,
+                'title': FACET_TITLES[facet_type],
+                'label': label,
+                'papers': [{'display': p['display'], 'href': p['href'], 'page': p['page']} for p in papers],
+            }, ensure_ascii=False))
+            written.add(path)
+        # 年份按时间倒序，其余按论文数从多到少
+        if facet_type == 'year':
+            values.sort(key=lambda v: v['label'], reverse=True)
+        else:
+            values.sort(key=lambda v: (-v['count'], v['label'].lower()))
+        facets[facet_type] = values
 
-</body>
-</html>
-"""
+    # --- 分页的列表页与每页的论点预览 ---
+    total_pages = max(1, (len(entries) + page_size - 1) // page_size)
+    for page_num in range(1, total_pages + 1):
+        page_entries = entries[(page_num - 1) * page_size:page_num * page_size]
+        if page_num == 1:
+            path, root = output_file, ''
+        else:
+            path, root = os.path.join(pages_dir, f"{page_num}.html"), '../'
+        write_if_changed(path, render_listing_page(page_num, total_pages, page_entries, len(entries), facets, root))
+        written.add(path)
+        preview_path = os.path.join(data_dir, 'previews', f"{page_num}.json")
+        write_if_changed(preview_path, json.dumps(
+            {entry['href']: entry['preview'] for entry in page_entries}, ensure_ascii=False))
+        written.add(preview_path)
 
-    # 将生成的 HTML 内容写入文件
+    facets_path = os.path.join(data_dir, 'facets.json')
+    write_if_changed(facets_path, json.dumps(facets, ensure_ascii=False))
+    written.add(facets_path)
+    removed = remove_stale(pages_dir, written)
+    for folder in ('previews', *FACET_TITLES):
+        removed += remove_stale(os.path.join(data_dir, folder), written)
+
+    # 将搜索索引写入文件
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        print(f"\n成功！index.html 已生成于: {os.path.abspath(output_file)}")
+        write_if_changed(search_file, json.dumps(search_entries, ensure_ascii=False))
+        print(f"\n成功！共 {len(entries)} 篇，{total_pages} 个列表页，首页: {os.path.abspath(output_file)}")
+        print(f"分面: " + '，'.join(f"{FACET_TITLES[t]} {len(v)} 个" for t, v in facets.items())
+              + (f"；删除过期文件 {removed} 个" if removed else ''))
+        print(f"搜索索引已生成于: {os.path.abspath(search_file)}")
     except IOError as e:
-        print(f"\n错误：无法写入文件 '{output_file}'。错误信息: {e}")
+        print(f"\n错误：无法写入文件。错误信息: {e}")
+        return
+
+    # 为首页、搜索索引与报告生成 .gz/.br 预压缩副本（只重写过期的副本）
+    written, removed = site_assets.compress_site(os.getcwd())
+    print(f"预压缩副本: 写出 {written} 个，删除 {removed} 个过期副本")
 
 if __name__ == "__main__":
-    generate_index_page()
\ No newline at end of file
+    generate_index_page()
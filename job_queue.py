@@ -0,0 +1,433 @@
+# job_queue.py
+"""
+基于 SQLite 的持久化任务队列，统一调度 paperbot、translator、索引与每日摘要。
+
+    python job_queue.py add summarise source_pdfs/xxx.pdf
+    python job_queue.py add translate "Leibniz and the Kabbalah.pdf" --title "莱布尼茨与卡巴拉"
+    python job_queue.py add index
+    python job_queue.py work --workers 3
+    python job_queue.py list
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+# --- 配置 ---
+REPO_DIR = Path(__file__).resolve().parent
+# 未设置 PAPERBOT_BASE_DIR 时以本仓库为站点根目录，按需导入的 paperbot 等模块也使用它
+os.environ.setdefault('PAPERBOT_BASE_DIR', str(REPO_DIR))
+
+
+def add_path(*parts):
+    path = str(REPO_DIR.joinpath(*parts))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+add_path('my-project')
+from paths import BASE_DIR
+
+QUEUE_PATH = Path(os.environ.get('JOB_QUEUE_PATH', BASE_DIR / 'jobs.sqlite3'))
+
+LEASE_SECONDS = 300          # 租约时长，worker 每 1/3 租约续期一次
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 60        # 第 n 次失败后等待 RETRY_BASE_DELAY * 2**(n-1) 秒再重试
+POLL_INTERVAL = 2
+
+# 每类任务使用的外部服务，以及默认优先级（数值越大越先执行）
+JOB_KINDS = {
+    'summarise': {'provider': 'gemini', 'priority': 10},
+    'index': {'provider': 'local', 'priority': 5},
+    'digest': {'provider': 'network', 'priority': 5},
+    'translate': {'provider': 'deepseek', 'priority': 0},
+}
+
+# 所有 worker 共享的并发上限（0 表示不限），长时间的书籍翻译不会占满 Gemini 的名额
+PROVIDER_LIMITS = {
+    'gemini': int(os.environ.get('JOB_QUEUE_LIMIT_GEMINI', '2')),
+    'deepseek': int(os.environ.get('JOB_QUEUE_LIMIT_DEEPSEEK', '1')),
+    'network': int(os.environ.get('JOB_QUEUE_LIMIT_NETWORK', '1')),
+    'local': 1,
+}
+# 同一服务相邻两次领取任务的最小间隔（秒，0 表示不限），记录在队列库中由所有 worker 共享，
+# 多个 worker 同时启动时不会在同一时刻一起向 Gemini 发出请求
+PROVIDER_MIN_INTERVAL = {
+    'gemini': float(os.environ.get('JOB_QUEUE_INTERVAL_GEMINI', '10')),
+    'deepseek': float(os.environ.get('JOB_QUEUE_INTERVAL_DEEPSEEK', '0')),
+    'network': float(os.environ.get('JOB_QUEUE_INTERVAL_NETWORK', '0')),
+    'local': 0,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    priority     INTEGER NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'queued',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_until  REAL,
+    worker       TEXT,
+    last_error   TEXT,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, priority DESC, id);
+CREATE TABLE IF NOT EXISTS provider_pacing (
+    provider TEXT PRIMARY KEY,
+    next_at  REAL NOT NULL
+);
+"""
+
+
+def connect(path=QUEUE_PATH):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# --- 入队与查询 ---
+def enqueue(conn, kind, payload=None, priority=None, max_attempts=DEFAULT_MAX_ATTEMPTS, dedupe=False):
+    """添加任务并返回其 id。dedupe=True 时若已有相同的待执行任务则直接返回那一个。"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"未知的任务类型: {kind}")
+    payload_json = json.dumps(payload or {}, ensure_ascii=False, sort_keys=True)
+    if dedupe:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE kind = ? AND payload = ? AND status = 'queued'", (kind, payload_json)
+        ).fetchone()
+        if row:
+            return row[0]
+    if priority is None:
+        priority = JOB_KINDS[kind]['priority']
+    now = time.time()
+    cur = conn.execute(
+        "INSERT INTO jobs (kind, payload, priority, max_attempts, available_at, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (kind, payload_json, priority, max_attempts, now, now, now),
+    )
+    return cur.lastrowid
+
+
+def claim(conn, worker_id):
+    """在一个写事务中回收过期租约并领取一个可执行的任务，没有时返回 None。"""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # 租约过期说明 worker 已崩溃（例如大书翻译时内存耗尽）；次数用尽的任务不再重试，避免无限循环
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', worker = NULL, lease_until = NULL, "
+            "last_error = COALESCE(last_error || '\n', '') || 'worker 租约过期（进程可能已崩溃）', updated_at = ? "
+            "WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+            (now, now),
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ? "
+            "WHERE status = 'running' AND lease_until < ?",
+            (now, now),
+        )
+        running = {}
+        for kind, count in conn.execute("SELECT kind, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY kind"):
+            provider = JOB_KINDS.get(kind, {}).get('provider')
+            running[provider] = running.get(provider, 0) + count
+        next_at = dict(conn.execute("SELECT provider, next_at FROM provider_pacing"))
+
+        candidates = conn.execute(
+            "SELECT id, kind, payload, attempts FROM jobs WHERE status = 'queued' AND available_at <= ? "
+            "ORDER BY priority DESC, id LIMIT 50",
+            (now,),
+        ).fetchall()
+        for job_id, kind, payload, attempts in candidates:
+            provider = JOB_KINDS[kind]['provider']
+            limit = PROVIDER_LIMITS.get(provider, 0)
+            if limit and running.get(provider, 0) >= limit:
+                continue
+            if next_at.get(provider, 0) > now:
+                continue
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (worker_id, now + LEASE_SECONDS, now, job_id),
+            )
+            interval = PROVIDER_MIN_INTERVAL.get(provider, 0)
+            if interval:
+                conn.execute(
+                    "INSERT INTO provider_pacing (provider, next_at) VALUES (?, ?) "
+                    "ON CONFLICT(provider) DO UPDATE SET next_at = excluded.next_at",
+                    (provider, now + interval),
+                )
+            conn.execute("COMMIT")
+            return {'id': job_id, 'kind': kind, 'payload': json.loads(payload), 'attempts': attempts + 1}
+        conn.execute("COMMIT")
+        return None
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+class LeaseLost(Exception):
+    """任务的租约已过期并被回收，当前 worker 不再拥有它。"""
+
+
+def complete(conn, job_id, worker_id):
+    cur = conn.execute(
+        "UPDATE jobs SET status = 'done', lease_until = NULL, last_error = NULL, updated_at = ? "
+        "WHERE id = ? AND worker = ? AND status = 'running'",
+        (time.time(), job_id, worker_id),
+    )
+    if not cur.rowcount:
+        raise LeaseLost(job_id)
+
+
+def fail(conn, job_id, error, worker_id):
+    """记录失败；未超过最大次数时按指数退避重新排队。"""
+    now = time.time()
+    row = conn.execute(
+        "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker = ? AND status = 'running'",
+        (job_id, worker_id),
+    ).fetchone()
+    if row is None:
+        raise LeaseLost(job_id)
+    attempts, max_attempts = row
+    if attempts < max_attempts:
+        delay = RETRY_BASE_DELAY * 2 ** (attempts - 1)
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, last_error = ?, "
+            "available_at = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (error, now + delay, now, job_id, worker_id),
+        )
+    else:
+        delay = None
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'failed', lease_until = NULL, last_error = ?, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (error, now, job_id, worker_id),
+        )
+    if not cur.rowcount:
+        raise LeaseLost(job_id)
+    return delay
+
+
+def _heartbeat(job_id, worker_id, stop_event, path):
+    """在后台线程中定期续租，长时间运行的翻译任务不会被其他 worker 抢走。"""
+    conn = connect(path)
+    while not stop_event.wait(LEASE_SECONDS / 3):
+        conn.execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + LEASE_SECONDS, job_id, worker_id),
+        )
+    conn.close()
+
+
+# --- 各类任务的执行函数（按需导入，避免 worker 启动时加载所有 SDK） ---
+def run_summarise(payload, conn):
+    import artifact_store
+    import near_duplicates
+    import paperbot
+
+    pdf_path = Path(payload['pdf'])
+    if not pdf_path.is_absolute():
+        pdf_path = BASE_DIR / pdf_path
+    store = artifact_store.ArtifactStore()
+    try:
+        ok = paperbot.process_pdf(pdf_path, store, near_duplicates.NearDuplicateIndex())
+        store.export_site(BASE_DIR)
+    finally:
+        store.close()
+    if not ok:
+        raise RuntimeError(f"未能为 {pdf_path.name} 生成报告")
+    # 新报告需要体现在首页，合并为一个待执行的索引任务
+    enqueue(conn, 'index', dedupe=True)
+
+
+def run_translate(payload, conn):
+    add_path('translator')
+    import translator
+
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    if not api_key:
+        raise RuntimeError("请设置 DEEPSEEK_API_KEY 环境变量")
+    result = translator.PDFTranslator(api_key).process_pdf_file(payload['pdf'], payload.get('title'))
+    if not result:
+        raise RuntimeError(f"翻译失败: {payload['pdf']}")
+
+
+def run_index(payload, conn):
+    add_path()
+    import generate_index
+
+    # generate_index 以当前目录为站点根目录
+    os.chdir(BASE_DIR)
+    generate_index.generate_index_page()
+
+
+def run_digest(payload, conn):
+    add_path('scripts')
+    import fetch_papers
+
+    fetch_papers.write_to_markdown(fetch_papers.fetch_and_filter())
+
+
+HANDLERS = {
+    'summarise': run_summarise,
+    'translate': run_translate,
+    'index': run_index,
+    'digest': run_digest,
+}
+
+
+def worker_loop(worker_num, path=QUEUE_PATH, exit_when_idle=False):
+    import usage_ledger
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{worker_num}"
+    conn = connect(path)
+    ledger = usage_ledger.UsageLedger()
+    print(f"[worker {worker_num}] 已启动 ({worker_id})，批次 {ledger.batch_id}")
+    while True:
+        # 批次预算由所有 worker 共享；策略为 stop 时不再领取新任务，剩余任务留在队列中
+        if ledger.should_stop():
+            print(f"[worker {worker_num}] [预算] 本批次估算费用 ${ledger.batch_cost():.4f} 已达上限，停止领取任务")
+            break
+        job = claim(conn, worker_id)
+        if job is None:
+            if exit_when_idle:
+                pending = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+                ).fetchone()[0]
+                if not pending:
+                    break
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        print(f"[worker {worker_num}] 开始任务 #{job['id']} {job['kind']} {job['payload']} (第 {job['attempts']} 次)")
+        stop_event = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(job['id'], worker_id, stop_event, path), daemon=True)
+        heartbeat.start()
+        try:
+            HANDLERS[job['kind']](job['payload'], conn)
+        except (Exception, SystemExit) as e:
+            # paperbot 在缺少 pdftotext 等致命错误时调用 sys.exit()，同样记为失败，而不是让 worker 退出、
+            # 任务一直停留在 running 直到租约过期
+            traceback.print_exc()
+            try:
+                delay = fail(conn, job['id'], f"{type(e).__name__}: {e}", worker_id)
+            except LeaseLost:
+                print(f"[worker {worker_num}] 任务 #{job['id']} 的租约已被回收，失败结果不予记录")
+            else:
+                if delay is None:
+                    print(f"[worker {worker_num}] ❌ 任务 #{job['id']} 已达到最大重试次数，标记为失败")
+                else:
+                    print(f"[worker {worker_num}] 任务 #{job['id']} 失败，{delay} 秒后重试")
+        else:
+            try:
+                complete(conn, job['id'], worker_id)
+                print(f"[worker {worker_num}] ✅ 任务 #{job['id']} 完成")
+            except LeaseLost:
+                print(f"[worker {worker_num}] 任务 #{job['id']} 的租约已被回收，完成结果不予记录")
+        finally:
+            stop_event.set()
+            heartbeat.join()
+    conn.close()
+    ledger.close()
+    print(f"[worker {worker_num}] 退出")
+
+
+def run_workers(count, exit_when_idle=False):
+    # 同一次启动的所有 worker 共享一个批次 id，费用与预算按批次汇总
+    os.environ.setdefault('PAPERBOT_BATCH_ID', time.strftime('%Y%m%d-%H%M%S') + f'-queue-{os.getpid()}')
+    if count == 1:
+        worker_loop(1, exit_when_idle=exit_when_idle)
+        return
+    # 只在启动多个 worker 时导入，cli.py status 等只读命令不必加载 multiprocessing
+    import multiprocessing
+
+    processes = [
+        multiprocessing.Process(target=worker_loop, args=(n + 1, QUEUE_PATH, exit_when_idle))
+        for n in range(count)
+    ]
+    for p in processes:
+        p.start()
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        print("正在停止 worker...")
+        for p in processes:
+            p.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="paperbot / translator / 索引 / 摘要 的统一任务队列")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    add = sub.add_parser('add', help="添加任务")
+    add.add_argument('kind', choices=sorted(JOB_KINDS))
+    add.add_argument('pdfs', nargs='*', help="summarise / translate 的 PDF 路径")
+    add.add_argument('--title', help="translate 使用的书籍标题")
+    add.add_argument('--priority', type=int, help="覆盖默认优先级（越大越先执行）")
+    add.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS)
+
+    work = sub.add_parser('work', help="启动 worker 进程")
+    work.add_argument('--workers', type=int, default=int(os.environ.get('JOB_QUEUE_WORKERS', '2')))
+    work.add_argument('--exit-when-idle', action='store_true', help="队列清空后退出")
+
+    lst = sub.add_parser('list', help="查看任务")
+    lst.add_argument('--status', choices=['queued', 'running', 'done', 'failed'])
+
+    retry = sub.add_parser('retry', help="把失败的任务重新排队")
+    retry.add_argument('ids', nargs='+', type=int)
+
+    args = parser.parse_args()
+
+    if args.command == 'work':
+        run_workers(args.workers, args.exit_when_idle)
+        return
+
+    conn = connect()
+    if args.command == 'add':
+        if args.kind in ('summarise', 'translate'):
+            if not args.pdfs:
+                parser.error(f"{args.kind} 任务需要至少一个 PDF 路径")
+            payloads = [{'pdf': pdf, 'title': args.title} if args.kind == 'translate' else {'pdf': pdf}
+                        for pdf in args.pdfs]
+        else:
+            payloads = [{}]
+        for payload in payloads:
+            job_id = enqueue(conn, args.kind, payload, args.priority, args.max_attempts)
+            print(f"已添加任务 #{job_id}: {args.kind} {payload}")
+    elif args.command == 'list':
+        query = "SELECT id, kind, status, priority, attempts, max_attempts, payload, last_error FROM jobs"
+        params = ()
+        if args.status:
+            query += " WHERE status = ?"
+            params = (args.status,)
+        for job_id, kind, status, priority, attempts, max_attempts, payload, error in conn.execute(
+                query + " ORDER BY id", params):
+            line = f"#{job_id:<5} {kind:<10} {status:<8} p={priority:<3} {attempts}/{max_attempts} {payload}"
+            if error and status != 'done':
+                line += f"\n        最近错误: {error}"
+            print(line)
+    elif args.command == 'retry':
+        now = time.time()
+        for job_id in args.ids:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'failed'",
+                (now, now, job_id),
+            )
+        print(f"已重新排队: {', '.join(map(str, args.ids))}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
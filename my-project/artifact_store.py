@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import zlib
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # 没有安装 zstandard 时退回标准库 zlib
+    zstandard = None
+
+from paths import BASE_DIR, atomic_write
+
+# =================== 路径配置 ===================
+STORE_PATH = Path(os.environ.get('PAPERBOT_STORE', BASE_DIR / 'artifacts.sqlite3'))
+
+# 每篇论文可保存的产物种类
+KIND_RAW_TEXT = 'raw_text'          # pdftotext 原始输出
+KIND_CLEANED_TEXT = 'cleaned_text'  # clean_hss_paper_text 之后的全文
+KIND_METADATA = 'metadata'          # Gemini 提取的 title/author/year (JSON)
+KIND_REPORT_HTML = 'report_html'    # 最终 HTML 报告
+KIND_PREVIEW = 'preview'            # 首页的论点预览
+KIND_SEARCH = 'search'              # 搜索索引中使用的小写纯文本
+KIND_DUPLICATE_OF = 'duplicate_of'  # 近似重复时指向已有报告的文件名
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    pdf_hash   TEXT PRIMARY KEY,
+    base_name  TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    pdf_hash     TEXT NOT NULL REFERENCES papers(pdf_hash) ON DELETE CASCADE,
+    kind         TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    codec        TEXT NOT NULL,
+    data         BLOB NOT NULL,
+    exported     TEXT,
+    PRIMARY KEY (pdf_hash, kind)
+);
+CREATE INDEX IF NOT EXISTS idx_papers_base_name ON papers(base_name);
+"""
+
+
+def file_sha256(path, block_size=1 << 20):
+    """按块计算文件的 SHA-256，用作论文的内容地址。"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _compress(raw):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(raw)
+    return 'zlib', zlib.compress(raw, 9)
+
+
+def _decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("该产物使用 zstd 压缩，请先安装 zstandard。")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    return data
+
+
+class ArtifactStore:
+    """以 PDF 哈希为键的单文件产物库（SQLite + 压缩 blob）。"""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 写入 ----------
+    def register_paper(self, pdf_hash, base_name):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO papers (pdf_hash, base_name, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(pdf_hash) DO UPDATE SET base_name = excluded.base_name, updated_at = excluded.updated_at",
+                (pdf_hash, base_name, time.time()),
+            )
+
+    def put(self, pdf_hash, kind, value):
+        """保存一个产物；内容未变化时不重写。返回是否发生了变化。"""
+        if not isinstance(value, (str, bytes)):
+            value = json.dumps(value, ensure_ascii=False)
+        raw = value.encode('utf-8') if isinstance(value, str) else value
+        content_hash = hashlib.sha256(raw).hexdigest()
+        row = self.conn.execute(
+            "SELECT content_hash FROM artifacts WHERE pdf_hash = ? AND kind = ?", (pdf_hash, kind)
+        ).fetchone()
+        if row and row[0] == content_hash:
+            return False
+        codec, data = _compress(raw)
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO artifacts (pdf_hash, kind, content_hash, codec, data, exported) VALUES (?, ?, ?, ?, ?, NULL) "
+                "ON CONFLICT(pdf_hash, kind) DO UPDATE SET content_hash = excluded.content_hash, "
+                "codec = excluded.codec, data = excluded.data, exported = NULL",
+                (pdf_hash, kind, content_hash, codec, data),
+            )
+            self.conn.execute("UPDATE papers SET updated_at = ? WHERE pdf_hash = ?", (time.time(), pdf_hash))
+        return True
+
+    def rekey(self, old_hash, new_hash):
+        """把一篇论文的全部产物改挂到新的键下（新键已有的同类产物保留）。"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO papers (pdf_hash, base_name, updated_at) "
+                "SELECT ?, base_name, ? FROM papers WHERE pdf_hash = ?",
+                (new_hash, time.time(), old_hash),
+            )
+            self.conn.execute("UPDATE OR IGNORE artifacts SET pdf_hash = ? WHERE pdf_hash = ?", (new_hash, old_hash))
+            self.conn.execute("DELETE FROM artifacts WHERE pdf_hash = ?", (old_hash,))
+            self.conn.execute("DELETE FROM papers WHERE pdf_hash = ?", (old_hash,))
+
+    def mark_exported(self, pdf_hash, kind):
+        """标记产物已与站点文件一致（例如报告已由流式生成直接写出）。"""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE artifacts SET exported = content_hash WHERE pdf_hash = ? AND kind = ?", (pdf_hash, kind)
+            )
+
+    # ---------- 读取 ----------
+    def get(self, pdf_hash, kind):
+        row = self.conn.execute(
+            "SELECT codec, data FROM artifacts WHERE pdf_hash = ? AND kind = ?", (pdf_hash, kind)
+        ).fetchone()
+        if row is None:
+            return None
+        return _decompress(row[0], row[1]).decode('utf-8')
+
+    def get_json(self, pdf_hash, kind):
+        value = self.get(pdf_hash, kind)
+        return json.loads(value) if value is not None else None
+
+    def has(self, pdf_hash, kind):
+        return self.conn.execute(
+            "SELECT 1 FROM artifacts WHERE pdf_hash = ? AND kind = ?", (pdf_hash, kind)
+        ).fetchone() is not None
+
+    def base_name(self, pdf_hash):
+        row = self.conn.execute("SELECT base_name FROM papers WHERE pdf_hash = ?", (pdf_hash,)).fetchone()
+        return row[0] if row else None
+
+    def papers(self):
+        return self.conn.execute("SELECT pdf_hash, base_name FROM papers ORDER BY base_name").fetchall()
+
+    # ---------- 导出静态站点文件 ----------
+    def export_site(self, base_dir=BASE_DIR):
+        """只把自上次导出后变化过的产物写成站点文件，返回写出的文件数。
+
+        index.html 与 search_data.json 由 generate_index.py 根据 summary_meta/ 侧车生成。
+        """
+        base_dir = Path(base_dir)
+        targets = {
+            KIND_CLEANED_TEXT: (base_dir / 'cleaned_txts', '.txt'),
+            KIND_REPORT_HTML: (base_dir / 'summary_htmls', '.html'),
+        }
+        rows = self.conn.execute(
+            "SELECT a.pdf_hash, a.kind, a.content_hash, a.codec, a.data, p.base_name "
+            "FROM artifacts a JOIN papers p USING (pdf_hash) "
+            "WHERE a.kind IN (?, ?) AND (a.exported IS NULL OR a.exported != a.content_hash)",
+            tuple(targets),
+        ).fetchall()
+        written = 0
+        for pdf_hash, kind, content_hash, codec, data, base_name in rows:
+            folder, suffix = targets[kind]
+            folder.mkdir(parents=True, exist_ok=True)
+            out_path = folder / f"{base_name}{suffix}"
+            atomic_write(out_path, _decompress(codec, data))
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE artifacts SET exported = ? WHERE pdf_hash = ? AND kind = ?",
+                    (content_hash, pdf_hash, kind),
+                )
+            written += 1
+            print(f"  -> 已导出: {out_path.relative_to(base_dir)}")
+        return written
+
+    def stats(self):
+        rows = self.conn.execute(
+            "SELECT kind, COUNT(*), SUM(LENGTH(data)) FROM artifacts GROUP BY kind ORDER BY kind"
+        ).fetchall()
+        return {kind: {'count': count, 'compressed_bytes': size} for kind, count, size in rows}
+
+
+def import_loose_files(store, base_dir=BASE_DIR):
+    """把现有的 cleaned_txts/ 和 summary_htmls/ 导入产物库。
+
+    旧文件没有对应的 PDF 哈希，这里先以清理后文本（或报告）的哈希作为键，
+    再由 link_legacy_pdfs 改为对应 PDF 的内容哈希。
+    """
+    base_dir = Path(base_dir)
+    names = set()
+    for folder, suffix in (('cleaned_txts', '.txt'), ('summary_htmls', '.html')):
+        path = base_dir / folder
+        if path.is_dir():
+            names.update(p.stem for p in path.iterdir() if p.suffix == suffix)
+
+    imported = 0
+    for name in sorted(names):
+        txt_path = base_dir / 'cleaned_txts' / f"{name}.txt"
+        html_path = base_dir / 'summary_htmls' / f"{name}.html"
+        key_source = txt_path if txt_path.exists() else html_path
+        key = 'legacy-' + file_sha256(key_source)
+        store.register_paper(key, name)
+        if txt_path.exists():
+            store.put(key, KIND_CLEANED_TEXT, txt_path.read_text(encoding='utf-8'))
+        if html_path.exists():
+            store.put(key, KIND_REPORT_HTML, html_path.read_text(encoding='utf-8'))
+        # 导入的内容与磁盘上的文件一致，无需再次导出
+        store.mark_exported(key, KIND_CLEANED_TEXT)
+        store.mark_exported(key, KIND_REPORT_HTML)
+        imported += 1
+    return imported
+
+
+def link_legacy_pdfs(store, pdf_folders):
+    """把 legacy- 键改为对应 PDF 的内容哈希，让“已有报告则跳过”对现有语料也生效。
+
+    旧文件与 PDF 之间没有文件名对应关系，这里提取 PDF 全文，用 near_duplicates.json 中的 MinHash
+    签名匹配到已导入的论文。需要 pdftotext；返回改键的论文数。
+    """
+    if shutil.which('pdftotext') is None:
+        print("未找到 pdftotext，跳过 PDF 与旧报告的关联。")
+        return 0
+    # paperbot 导入了本模块，这里按需导入
+    import near_duplicates
+    import paperbot
+
+    legacy = {name: key for key, name in store.papers() if key.startswith('legacy-')}
+    duplicate_index = near_duplicates.NearDuplicateIndex()
+    linked = 0
+    for folder in pdf_folders:
+        folder = Path(folder)
+        if not folder.is_dir():
+            continue
+        for pdf_path in sorted(folder.glob('*.pdf')):
+            pdf_hash = file_sha256(pdf_path)
+            if store.has(pdf_hash, KIND_REPORT_HTML):
+                continue
+            raw_text = paperbot.extract_text_with_pdftotext(pdf_path)
+            if not raw_text:
+                continue
+            match = duplicate_index.query(text=paperbot.clean_hss_paper_text(raw_text))
+            if match and match[0] in legacy:
+                store.rekey(legacy.pop(match[0]), pdf_hash)
+                linked += 1
+                print(f"  -> {pdf_path.name} => {match[0]} ({match[1]:.0%})")
+    return linked
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    with ArtifactStore() as store:
+        if command == 'import':
+            count = import_loose_files(store)
+            print(f"已导入 {count} 篇论文到 {store.path}")
+            linked = link_legacy_pdfs(store, [BASE_DIR / 'finished_pdfs', BASE_DIR / 'source_pdfs'])
+            print(f"已按 PDF 内容哈希关联 {linked} 篇论文")
+        elif command == 'export':
+            count = store.export_site()
+            print(f"导出完成，写出 {count} 个文件。")
+        elif command == 'stats':
+            print(f"产物库: {store.path}")
+            print(f"论文数: {len(store.papers())}")
+            for kind, info in store.stats().items():
+                print(f"  {kind:<14} {info['count']:>5} 个, 压缩后 {info['compressed_bytes'] / 1024:.1f} KiB")
+        else:
+            print("用法: python artifact_store.py [import|export|stats]")
+
+
+if __name__ == '__main__':
+    main()
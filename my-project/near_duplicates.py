@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台没有 flock，退化为不加锁的整体写入
+    fcntl = None
+
+from paths import BASE_DIR, atomic_write
+
+# =================== 配置 ===================
+INDEX_PATH = Path(os.environ.get('PAPERBOT_MINHASH_INDEX', BASE_DIR / 'near_duplicates.json'))
+
+# 同一论文的不同版本（录用稿与排版稿、单栏与双栏）在 pdftotext 下差异较大，
+# 按现有语料测得：词二元组的 Jaccard 对重复论文约为 0.6，对不同论文约 0.1 左右
+SHINGLE_SIZE = 2        # 以 2 个纯字母词为一个 shingle
+NUM_PERM = 120          # 签名长度
+BANDS = 40              # LSH 分段数，每段 NUM_PERM // BANDS 行
+DUPLICATE_THRESHOLD = 0.5  # 估计 Jaccard 相似度达到该值即视为同一篇论文
+
+_HASH_SPACE = 1 << 64
+_BIN_WIDTH = _HASH_SPACE // NUM_PERM
+_EMPTY = _HASH_SPACE
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """把文本规范化为小写纯字母词序列（去掉数字与页眉编号），返回词级 shingle 集合。"""
+    words = re.findall(r'[^\W\d_]+', text.lower())
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(text):
+    """单次哈希的 MinHash（one-permutation hashing + 旋转补齐空桶）。
+
+    每个 shingle 只计算一次哈希，按哈希值落入 NUM_PERM 个桶并取桶内最小值，
+    开销与论文长度成线性关系。
+    """
+    signature = [_EMPTY] * NUM_PERM
+    for shingle in shingles(text):
+        h = _hash64(shingle)
+        b = h // _BIN_WIDTH
+        if b >= NUM_PERM:
+            b = NUM_PERM - 1
+        offset = h - b * _BIN_WIDTH
+        if offset < signature[b]:
+            signature[b] = offset
+    # 空桶借用右侧最近非空桶的值，并混入距离，保持签名可比
+    if any(v == _EMPTY for v in signature) and any(v != _EMPTY for v in signature):
+        filled = list(signature)
+        for i in range(NUM_PERM):
+            if signature[i] != _EMPTY:
+                continue
+            j, dist = (i + 1) % NUM_PERM, 1
+            while signature[j] == _EMPTY:
+                j, dist = (j + 1) % NUM_PERM, dist + 1
+            filled[i] = signature[j] + dist * _BIN_WIDTH
+        signature = filled
+    return signature
+
+
+def estimate_similarity(sig_a, sig_b):
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def _band_keys(signature):
+    rows = NUM_PERM // BANDS
+    return [f"{band}:" + ','.join(map(str, signature[band * rows:(band + 1) * rows])) for band in range(BANDS)]
+
+
+class NearDuplicateIndex:
+    """MinHash 签名 + LSH 分桶，查询只比较同桶候选，与语料规模基本无关。"""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = Path(path)
+        self.signatures = {}
+        self.buckets = {}
+        # 自加载以来本进程新增/删除的论文，save() 时合并进磁盘上的最新版本
+        self._added = set()
+        self._removed = set()
+        for name, signature in self._read().items():
+            self._insert(name, signature)
+
+    def _read(self):
+        if not self.path.exists():
+            return {}
+        return json.loads(self.path.read_text(encoding='utf-8')).get('signatures', {})
+
+    def _insert(self, name, signature):
+        self.signatures[name] = signature
+        for key in _band_keys(signature):
+            self.buckets.setdefault(key, set()).add(name)
+
+    def add(self, name, text=None, signature=None):
+        if signature is None:
+            signature = minhash_signature(text)
+        if name in self.signatures:
+            self.remove(name)
+        self._insert(name, signature)
+        self._added.add(name)
+        self._removed.discard(name)
+        return signature
+
+    def remove(self, name):
+        signature = self.signatures.pop(name, None)
+        if signature is None:
+            return
+        self._added.discard(name)
+        self._removed.add(name)
+        for key in _band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket:
+                bucket.discard(name)
+                if not bucket:
+                    del self.buckets[key]
+
+    def query(self, text=None, signature=None, threshold=DUPLICATE_THRESHOLD):
+        """返回 (已有论文名, 估计相似度)，没有近似重复时返回 None。"""
+        if signature is None:
+            signature = minhash_signature(text)
+        candidates = set()
+        for key in _band_keys(signature):
+            candidates |= self.buckets.get(key, set())
+        best = None
+        for name in candidates:
+            score = estimate_similarity(signature, self.signatures[name])
+            if score >= threshold and (best is None or score > best[1]):
+                best = (name, score)
+        return best
+
+    def save(self):
+        """在文件锁内重新读取磁盘上的索引，合并本进程的增删后写回。
+
+        多个 worker 并发处理论文时各自持有一个索引实例，直接整体覆盖会丢掉其他 worker 新增的签名。
+        """
+        lock_path = self.path.with_name(self.path.name + '.lock')
+        with open(lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            merged = self._read()
+            for name in self._removed:
+                merged.pop(name, None)
+            for name in self._added:
+                merged[name] = self.signatures[name]
+            atomic_write(self.path, json.dumps({
+                'params': {'shingle_size': SHINGLE_SIZE, 'num_perm': NUM_PERM, 'bands': BANDS},
+                'signatures': merged,
+            }))
+        # 同步其他进程写入的签名，后续查询也能发现它们
+        for name, signature in merged.items():
+            if self.signatures.get(name) != signature:
+                self._insert(name, signature)
+        self._added.clear()
+        self._removed.clear()
+
+
+def build_from_folder(index, txt_folder):
+    """用 cleaned_txts 中的全文构建索引，返回发现的近似重复对。"""
+    duplicates = []
+    for txt_path in sorted(Path(txt_folder).glob('*.txt')):
+        signature = minhash_signature(txt_path.read_text(encoding='utf-8'))
+        match = index.query(signature=signature)
+        if match and match[0] != txt_path.stem:
+            duplicates.append((txt_path.stem, match[0], match[1]))
+        index.add(txt_path.stem, signature=signature)
+    return duplicates
+
+
+if __name__ == '__main__':
+    txt_folder = Path(sys.argv[1]) if len(sys.argv) > 1 else BASE_DIR / 'cleaned_txts'
+    index = NearDuplicateIndex()
+    duplicates = build_from_folder(index, txt_folder)
+    index.save()
+    print(f"索引已保存: {index.path}（{len(index.signatures)} 篇）")
+    for name, existing, score in duplicates:
+        print(f"  近似重复 ({score:.0%}): {name}\n      -> {existing}")
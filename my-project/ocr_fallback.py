@@ -0,0 +1,94 @@
+import hashlib
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from paths import BASE_DIR, atomic_write
+
+# =================== OCR 配置 ===================
+# 页面级 OCR 缓存：以渲染后页面图像的哈希为键，PDF 其余部分变化时不必重新识别
+OCR_CACHE_DIR = Path(os.environ.get('OCR_CACHE_DIR', BASE_DIR / '.ocr_cache'))
+# 每页非空白字符少于该值即视为扫描页
+MIN_CHARS_PER_PAGE = int(os.environ.get('OCR_MIN_CHARS_PER_PAGE', '200'))
+OCR_LANG = os.environ.get('OCR_LANG', 'eng')
+OCR_DPI = int(os.environ.get('OCR_DPI', '300'))
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', str(os.cpu_count() or 2)))
+
+
+def page_char_count(text):
+    """统计一页中的非空白字符数。"""
+    return sum(1 for ch in text or '' if not ch.isspace())
+
+
+def find_low_text_pages(pages, min_chars=MIN_CHARS_PER_PAGE):
+    """返回文本量过少（疑似扫描）的页面下标列表（从0开始）。"""
+    return [i for i, text in enumerate(pages) if page_char_count(text) < min_chars]
+
+
+def ocr_available():
+    return shutil.which('pdftoppm') is not None and shutil.which('tesseract') is not None
+
+
+def _ocr_one_page(args):
+    """在子进程中渲染并识别单页；命中缓存时跳过 tesseract。"""
+    pdf_path, page_index, lang, dpi, cache_dir = args
+    page_no = page_index + 1
+    rendered = subprocess.run(
+        ['pdftoppm', '-r', str(dpi), '-f', str(page_no), '-l', str(page_no), '-png', '-singlefile', str(pdf_path)],
+        capture_output=True, check=True,
+    ).stdout
+    key = hashlib.sha256(rendered + f"|{lang}|{dpi}".encode('utf-8')).hexdigest()
+    cache_path = Path(cache_dir) / f"{key}.txt"
+    if cache_path.exists():
+        return page_index, cache_path.read_text(encoding='utf-8'), True
+
+    text = subprocess.run(
+        ['tesseract', 'stdin', 'stdout', '-l', lang],
+        input=rendered, capture_output=True, check=True,
+    ).stdout.decode('utf-8', errors='replace')
+    atomic_write(cache_path, text)
+    return page_index, text, False
+
+
+def ocr_pages(pdf_path, page_indices, lang=OCR_LANG, dpi=OCR_DPI, workers=OCR_WORKERS, cache_dir=OCR_CACHE_DIR):
+    """用进程池并行 OCR 指定页面，返回 {页面下标: 文本}。"""
+    if not page_indices:
+        return {}
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    jobs = [(str(pdf_path), i, lang, dpi, str(cache_dir)) for i in page_indices]
+    results = {}
+    hits = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        for page_index, text, cached in pool.map(_ocr_one_page, jobs):
+            results[page_index] = text
+            hits += cached
+    print(f"   -> OCR完成: {len(jobs)} 页（缓存命中 {hits} 页）")
+    return results
+
+
+def fill_scanned_pages(pdf_path, pages, min_chars=MIN_CHARS_PER_PAGE):
+    """把文本量过少的页面替换为 OCR 结果，其余页面保持原样。
+
+    OCR 工具不可用或识别失败时返回原始页面列表。
+    """
+    low_pages = find_low_text_pages(pages, min_chars)
+    if not low_pages:
+        return pages
+    print(f"   -> 检测到 {len(low_pages)}/{len(pages)} 页文本过少，疑似扫描页，准备OCR...")
+    if not ocr_available():
+        print("   [警告] 未找到 'pdftoppm' 或 'tesseract'，跳过OCR。请安装 poppler-utils 和 tesseract-ocr。")
+        return pages
+    try:
+        ocr_results = ocr_pages(pdf_path, low_pages)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"   [警告] OCR 失败，保留原始文本: {e}")
+        return pages
+
+    filled = list(pages)
+    for i, text in ocr_results.items():
+        # 只有 OCR 结果确实更多时才替换，避免空白页被噪声覆盖
+        if page_char_count(text) > page_char_count(filled[i]):
+            filled[i] = text
+    return filled
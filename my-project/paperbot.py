@@ -2,20 +2,33 @@ import subprocess
 import re
 import os
 import sys
+import time
+import datetime
 from pathlib import Path
-import google.generativeai as genai
 import json
 
-# =================== 路径配置 ===================
-# 默认工作目录（可由环境变量 PAPERBOT_BASE_DIR 覆盖）
-BASE_DIR = Path(os.environ.get('PAPERBOT_BASE_DIR', '/workspaces/xiaoqizhangxz-arch.github.io'))
+import artifact_store
+import ocr_fallback
+import prompt_cache
+import report_extract
+import near_duplicates
+import report_repair
+import site_assets
+import usage_ledger
+from paths import BASE_DIR, atomic_write
 
+# =================== 路径配置 ===================
 # 三个目录
 INPUT_PDF_FOLDER = BASE_DIR / 'source_pdfs'
 OUTPUT_TXT_FOLDER = BASE_DIR / 'cleaned_txts'
 OUTPUT_HTML_FOLDER = BASE_DIR / 'summary_htmls'
+# 流式输出中断时保留的部分报告；放在发布目录之外（已加入 .gitignore），不会被索引或部署
+PARTIAL_REPORT_FOLDER = BASE_DIR / '.partial_reports'
 
 MODEL_NAME = "models/gemini-2.5-pro"
+# 静态提示词前缀在服务端缓存的存活时间；长时间运行的 worker 在到期前 PROMPT_CACHE_REFRESH 内续期
+PROMPT_CACHE_TTL = datetime.timedelta(hours=1)
+PROMPT_CACHE_REFRESH = datetime.timedelta(minutes=10)
 
 # =================== Gemini Prompts ===================
 
@@ -43,7 +56,9 @@ METADATA_EXTRACTION_PROMPT = """
 """
 
 # 您的主分析Prompt
-PAPERBOT_PROMPT_TEMPLATE = """
+# 静态前缀在每次调用中逐字节相同，只需向服务端注册一次上下文缓存；
+# 文章全文放在之后的 PAPERBOT_ARTICLE_TEMPLATE 中。
+PAPERBOT_PROMPT_PREFIX = """
 你将扮演一个多阶段的学术分析专家。你的任务是接收我粘贴的学术文章全文，并严格按照以下两个阶段来完成任务。
 
 ## 第一阶段：内部流程：初步分析与专家角色设定
@@ -52,7 +67,7 @@ PAPERBOT_PROMPT_TEMPLATE = """
 2.  **扮演领域专家**: 立即转变为该领域的顶尖教授和资深专家。后续所有分析、总结和评论都必须基于此专家视角，运用最精准的专业术语，展现对相关理论和学者的深度了解，并提供批判性、富有洞察力的分析。
 
 ## 第二阶段：输出格式：生成单一、完整的HTML深度分析报告
-在你成功设定并进入专家角色后，开始撰写一份单一、完整的HTML分析报告。报告必须严格遵循以下结构和格式：
+在你成功设定并进入专家角色后，开始撰写一份单一、完整的HTML分析报告正文。报告必须严格遵循以下结构和格式：
 报告的总体格式：
 报告的顶层标题 <h1> 必须是所分析文章的完整标题。
 在 <h1> 标题下方，必须紧跟一个 <p class="author"> 标签，用以显示文章的作者。
@@ -95,41 +110,18 @@ PAPERBOT_PROMPT_TEMPLATE = """
 
 最终检查指令：在你生成所有HTML内容后，请进行最后一次自我检查：确保每一个 <table> 中的每一个 <tr> 都严格只有两个 <td> 元素。如果有多余的列，必须修正你的输出。
 
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <title>学术文章深度分析报告</title>
-    <style>
-        body {{ font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", "Helvetica Neue", "Arial", "PingFang SC", "Hiragino Sans GB", "Microsoft YaHei", "SimHei", "SimSun", sans-serif; line-height: 1.8; margin: 2em; color: #333; background-color: #fdfdfd; }}
-        .container {{ max-width: 1200px; margin: auto; }}
-        h1 {{ font-size: 2.2em; text-align: center; color: #333; margin-bottom: 0.2em; }}
-        .author {{ text-align: center; font-size: 1.2em; color: #666; margin-top: 0; margin-bottom: 2em; border-bottom: 3px solid #005A9C; padding-bottom: 1em; }}
-        h2 {{ font-size: 2em; margin-top: 2.5em; color: #005A9C; border-bottom: 2px solid #f0f0f0; padding-bottom: 10px; }}
-        h3 {{ font-size: 1.5em; margin-top: 1.5em; color: #005A9C; border-bottom: 1px solid #e0e0e0; }}
-        h4.argument-theme {{ font-size: 1.1em; color: #333; margin-top: 1.2em; margin-bottom: 0.5em; border-left: 4px solid #005A9C; padding-left: 8px; }}
-        table {{ width: 100%; border-collapse: collapse; margin-top: 20px; box-shadow: 0 4px 8px rgba(0,0,0,0.05); table-layout: fixed; }}
-        th, td {{ padding: 12px 15px; text-align: left; border: 1px solid #ddd; vertical-align: top; word-wrap: break-word; }}
-        thead {{ background-color: #005A9C; color: white; }}
-        tbody tr:nth-child(even) {{ background-color: #f7f9fc; }}
-        tbody tr:hover {{ background-color: #eef4ff; }}
-        a {{ text-decoration: none; color: #007BFF; font-weight: 500; }}
-        a:hover {{ text-decoration: underline; color: #0056b3; }}
-        ul {{ padding-left: 20px; margin: 0; }}
-        li {{ margin-bottom: 10px; }}
-        td ul {{ padding-left: 0; list-style-type: none; }}
-        td ul li:last-child {{ margin-bottom: 0; }}
-        blockquote {{ font-size: 0.9em; color: #555; border-left: 3px solid #ccc; padding-left: 10px; margin: 8px 0 0 0; font-style: italic; }}
-        .summary-section p {{ text-indent: 2em; }}
-        .reference-column {{ font-size: 0.9em; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        </div>
-</body>
-</html>
+输出范围：只输出报告正文，即下面骨架中的 <div class="container"> 元素及其全部内容。不要输出 <!DOCTYPE>、<html>、<head>、<body>、<style> 或任何CSS，页面外壳与样式表由站点统一添加。可用的 class 只有 author、summary-section 与 argument-theme。
+
+<div class="container">
+    <h1>文章完整标题</h1>
+    <p class="author">作者</p>
+    <div class="summary-section">
+        <h2>全文概要总结</h2>
+    </div>
+</div>
+"""
 
+PAPERBOT_ARTICLE_TEMPLATE = """
 以下是我要分析的文章全文：
 ---
 {article_text}
@@ -138,7 +130,29 @@ PAPERBOT_PROMPT_TEMPLATE = """
 
 # =================== 功能函数 ===================
 
-def extract_metadata_with_gemini(raw_text_chunk):
+# 本批次所有 Gemini 调用的 token 与费用记账
+_usage_ledger = None
+
+def load_genai(api_key):
+    """按需导入并配置 Gemini SDK，只生成索引、查看状态等不调用模型的命令不必加载它。"""
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai
+
+def get_usage_ledger():
+    global _usage_ledger
+    if _usage_ledger is None:
+        _usage_ledger = usage_ledger.UsageLedger()
+    return _usage_ledger
+
+def record_gemini_usage(paper, purpose, model_name, usage_metadata, seconds):
+    """paper 为 (PDF内容哈希, 显示名称)；返回本次调用的估算费用。"""
+    subject, label = paper or ('unknown', None)
+    input_tokens, cached_tokens, output_tokens = usage_ledger.gemini_usage(usage_metadata)
+    return get_usage_ledger().record('paper', subject, 'gemini', model_name, purpose,
+                                     input_tokens, cached_tokens, output_tokens, seconds, label=label)
+
+def extract_metadata_with_gemini(raw_text_chunk, paper=None):
     """使用Gemini API从原始文本块中智能提取元数据。"""
     print("   -> 正在使用Gemini提取元数据...")
     try:
@@ -146,11 +160,15 @@ def extract_metadata_with_gemini(raw_text_chunk):
         if not api_key:
             print("      [错误] Gemini API 密钥未设置。")
             return None
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("models/gemini-2.5-flash")
+        genai = load_genai(api_key)
+        model_name = "models/gemini-2.5-flash"
+        model = genai.GenerativeModel(model_name)
         
         prompt = METADATA_EXTRACTION_PROMPT.format(text_chunk=raw_text_chunk)
+        start = time.monotonic()
         response = model.generate_content(prompt, request_options={'timeout': 120})
+        record_gemini_usage(paper, 'metadata', model_name, getattr(response, 'usage_metadata', None),
+                            time.monotonic() - start)
         
         json_text = extract_gemini_content(response).strip()
         json_text = re.sub(r'^```json\n', '', json_text)
@@ -188,13 +206,21 @@ def sanitize_filename(name):
     return sanitized.strip()
 
 def extract_text_with_pdftotext(pdf_path):
-    """使用pdftotext从PDF中提取高质量的、保持布局的文本。"""
+    """使用pdftotext从PDF中提取高质量的、保持布局的文本。
+
+    文本量过少的页面（扫描页）会交给 ocr_fallback 用 Tesseract 识别后替换。
+    """
     try:
         result = subprocess.run(
             ['pdftotext', '-layout', '-enc', 'UTF-8', str(pdf_path), '-'],
             capture_output=True, text=True, check=True, encoding='utf-8'
         )
-        return result.stdout
+        # pdftotext 以换页符分隔各页
+        pages = result.stdout.split('\f')
+        if pages and not pages[-1].strip():
+            pages.pop()
+        pages = ocr_fallback.fill_scanned_pages(pdf_path, pages)
+        return '\f'.join(pages)
     except FileNotFoundError:
         print("\n[错误] 未找到 'pdftotext' 命令。请先安装 poppler-utils。")
         sys.exit(1)
@@ -232,27 +258,356 @@ def extract_gemini_content(response):
             return response.candidates[0].content.parts[0].text
     return str(response)
 
-def generate_html_report(cleaned_text):
-    """调用Gemini API生成HTML报告。"""
+# 本次运行中报告生成调用的缓存命中统计
+REPORT_CACHE_STATS = prompt_cache.CacheStats("报告生成")
+# 模型名 -> (model, 前缀是否已在服务端缓存, CachedContent 或 None, 缓存到期的 time.monotonic())
+_report_models = {}
+
+def build_report_prompt(cleaned_text):
+    """返回 [静态前缀, 文章部分]，前缀在所有调用之间保持逐字节一致。"""
+    return [PAPERBOT_PROMPT_PREFIX, PAPERBOT_ARTICLE_TEMPLATE.format(article_text=cleaned_text)]
+
+def get_report_model(model_name=MODEL_NAME):
+    """返回 (model, 前缀是否已在服务端缓存)。
+
+    每个模型只注册一次显式上下文缓存，临近到期时续期（续期失败则重新注册），
+    job_queue worker、监视模式等长时间运行的进程不会用到已过期的缓存；
+    前缀不足服务端最小缓存长度或 SDK 不支持时，退回普通模型，此时依靠相同前缀触发隐式缓存。
+    """
+    entry = _report_models.get(model_name)
+    if entry is not None:
+        model, prefix_cached, cache, expires_at = entry
+        if cache is None or time.monotonic() < expires_at - PROMPT_CACHE_REFRESH.total_seconds():
+            return model, prefix_cached
+        try:
+            cache.update(ttl=PROMPT_CACHE_TTL)
+            _report_models[model_name] = (model, True, cache,
+                                          time.monotonic() + PROMPT_CACHE_TTL.total_seconds())
+            print(f"   -> 已续期提示词前缀缓存: {cache.name}")
+            return model, True
+        except Exception as e:
+            print(f"   -> 续期提示词前缀缓存失败，重新注册: {e}")
+            del _report_models[model_name]
+    import google.generativeai as genai
+    try:
+        from google.generativeai import caching
+        cache = caching.CachedContent.create(
+            model=model_name,
+            display_name='paperbot-report-prefix',
+            contents=[PAPERBOT_PROMPT_PREFIX],
+            ttl=PROMPT_CACHE_TTL,
+        )
+        _report_models[model_name] = (genai.GenerativeModel.from_cached_content(cached_content=cache), True,
+                                      cache, time.monotonic() + PROMPT_CACHE_TTL.total_seconds())
+        print(f"   -> 已注册提示词前缀缓存: {cache.name}")
+    except Exception as e:
+        print(f"   -> 未能创建显式上下文缓存，改用隐式前缀缓存: {e}")
+        _report_models[model_name] = (genai.GenerativeModel(model_name), False, None, None)
+    return _report_models[model_name][:2]
+
+def is_prompt_cache_error(error):
+    """显式缓存已过期或被删除时，请求会以 NotFound / PermissionDenied 失败，消息中提到 CachedContent。"""
+    message = str(error).lower().replace(' ', '')
+    return 'cachedcontent' in message or type(error).__name__ in ('NotFound', 'PermissionDenied')
+
+def start_report_stream(model_name, cleaned_text):
+    """发起流式报告请求并返回响应。
+
+    缓存的前缀意外失效（例如在续期前被服务端清除）时，丢弃该缓存，改用普通模型在请求中内联静态前缀，
+    下一篇论文会重新注册缓存。
+    """
+    model, prefix_cached = get_report_model(model_name)
+    prompt_parts = build_report_prompt(cleaned_text)
+    if not prefix_cached:
+        return model.generate_content(prompt_parts, stream=True, request_options={'timeout': 600})
+    try:
+        # 静态前缀已在缓存中，只发送文章部分
+        return model.generate_content(prompt_parts[1:], stream=True, request_options={'timeout': 600})
+    except Exception as e:
+        if not is_prompt_cache_error(e):
+            raise
+        print(f"   -> 提示词前缀缓存已失效，本次改为内联前缀: {e}")
+        _report_models.pop(model_name, None)
+        import google.generativeai as genai
+        model = genai.GenerativeModel(model_name)
+        return model.generate_content(prompt_parts, stream=True, request_options={'timeout': 600})
+
+def select_report_model():
+    """批次预算用尽且策略为 downgrade 时改用更便宜的模型。"""
+    model_name = get_usage_ledger().gemini_model(MODEL_NAME)
+    if model_name != MODEL_NAME:
+        print(f"   -> [预算] 本批次费用已达上限，改用 {model_name}")
+    return model_name
+
+class FenceStripper:
+    """流式剥离 Gemini 输出首尾的 ```html / ``` 代码围栏。
+
+    开头的围栏行在遇到第一个换行前暂存判断；结尾保留少量字符不写出，
+    直到流结束时再确认是否为收尾的 ```。
+    """
+    HOLD_BACK = 8
+
+    def __init__(self):
+        self.head_done = False
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        if not self.head_done:
+            if '\n' not in self.buffer and len(self.buffer.lstrip()) < 16:
+                return ""
+            self.buffer = re.sub(r'^\s*```(?:html)?[ \t]*\n', '', self.buffer, flags=re.IGNORECASE)
+            self.head_done = True
+        if len(self.buffer) <= self.HOLD_BACK:
+            return ""
+        out, self.buffer = self.buffer[:-self.HOLD_BACK], self.buffer[-self.HOLD_BACK:]
+        return out
+
+    def flush(self):
+        tail = self.buffer
+        if not self.head_done:
+            tail = re.sub(r'^\s*```(?:html)?[ \t]*\n', '', tail, flags=re.IGNORECASE)
+        tail = re.sub(r'\n?```\s*$', '', tail)
+        self.buffer = ""
+        self.head_done = True
+        return tail
+
+def partial_report_path(html_path):
+    """返回报告流式输出中断时保留部分正文的路径。"""
+    return PARTIAL_REPORT_FOLDER / f"{Path(html_path).stem}.partial.html"
+
+def generate_html_report(cleaned_text, html_path, paper=None):
+    """以流式方式调用Gemini API生成HTML报告正文，边接收边写入临时文件。
+
+    成功时返回模型输出的报告正文（尚未包装为页面，由调用方校验、修复后再包装写入 html_path）；
+    失败时把收到的正文保留在 partial_report_path(html_path) 以便诊断或续写，返回 None。
+    """
     api_key = os.environ.get('GEMINI_API_KEY')
     if not api_key:
         print("\n[错误] Gemini API 密钥未在环境变量 GEMINI_API_KEY 中设置。")
         return None
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(MODEL_NAME)
-    full_prompt = PAPERBOT_PROMPT_TEMPLATE.format(article_text=cleaned_text)
+    load_genai(api_key)
+    model_name = select_report_model()
+
+    # 临时文件与部分输出都写在发布目录之外
+    partial_path = partial_report_path(html_path)
+    partial_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = partial_path.with_name(partial_path.name + '.part')
+    stripper = FenceStripper()
+    pieces = []
+    output_tokens = None
+    usage = None
+    start = time.monotonic()
+    first_token_at = None
+
     try:
-        print("   -> 正在发送主分析请求，等待Gemini生成HTML...(可能需要几分钟)")
-        response = model.generate_content(full_prompt, request_options={'timeout': 600})
-        html_content = extract_gemini_content(response)
-        html_content = re.sub(r'^```html\n', '', html_content, flags=re.IGNORECASE)
-        html_content = re.sub(r'\n```$', '', html_content)
-        return html_content.strip()
+        print("   -> 正在发送主分析请求，流式接收Gemini生成的HTML...")
+        response = start_report_stream(model_name, cleaned_text)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for chunk in response:
+                text = extract_gemini_content(chunk)
+                if not text:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                    print(f"   -> 首个token耗时: {first_token_at - start:.1f}s")
+                # usage_metadata 随最后一个分块给出完整统计
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                if usage is not None and getattr(usage, 'candidates_token_count', None):
+                    output_tokens = usage.candidates_token_count
+                out = stripper.feed(text)
+                if out:
+                    f.write(out)
+                    f.flush()
+                    pieces.append(out)
+            tail = stripper.flush()
+            f.write(tail)
+            pieces.append(tail)
     except Exception as e:
         print(f"\n[错误] Gemini API 主分析阶段出错: {e}")
+        if usage is not None:
+            record_gemini_usage(paper, 'report', model_name, usage, time.monotonic() - start)
+        # 保留已收到的部分，供诊断或续写提示使用
+        if tmp_path.exists():
+            with open(tmp_path, 'a', encoding='utf-8') as f:
+                f.write(stripper.flush())
+            os.replace(tmp_path, partial_path)
+            print(f"   部分输出已保留: {partial_path.name}")
         return None
 
+    html_content = ''.join(pieces).strip()
+    if not html_content:
+        tmp_path.unlink(missing_ok=True)
+        print("\n[错误] Gemini 返回了空内容。")
+        return None
+    body = site_assets.extract_report_body(html_content)
+    tmp_path.unlink(missing_ok=True)
+
+    elapsed = time.monotonic() - start
+    gen_time = elapsed - ((first_token_at or start) - start)
+    if output_tokens is None:
+        # 没有 usage_metadata 时按字符粗略估算
+        output_tokens = len(html_content) // 4
+    rate = output_tokens / gen_time if gen_time > 0 else 0.0
+    print(f"   -> 生成完成: 共 {elapsed:.1f}s，约 {output_tokens} tokens，{rate:.1f} tokens/s")
+    if usage is not None:
+        prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+        cached_tokens = getattr(usage, 'cached_content_token_count', 0) or 0
+        REPORT_CACHE_STATS.record(prompt_tokens, cached_tokens)
+        ratio = cached_tokens / prompt_tokens if prompt_tokens else 0.0
+        print(f"   -> 输入 {prompt_tokens} tokens，其中缓存命中 {cached_tokens} ({ratio:.1%})")
+        cost = record_gemini_usage(paper, 'report', model_name, usage, elapsed)
+        print(f"   -> 本次调用估算费用: ${cost:.4f} ({model_name})")
+    return body
+
+def repair_html_report(html_content, cleaned_text, metadata, paper=None):
+    """只针对缺失的概要小节、截断的表格或错列的表格重新请求模型，返回 (HTML, 剩余问题)。
+
+    无论修复是否成功，返回的都是包装好的完整页面，调用方不会写出缺少页面外壳的正文。
+    """
+    unrepaired = site_assets.wrap_report(site_assets.extract_report_body(html_content))
+    api_key = os.environ.get('GEMINI_API_KEY')
+    if not api_key:
+        print("\n[错误] Gemini API 密钥未在环境变量 GEMINI_API_KEY 中设置。")
+        return unrepaired, report_repair.validate_report(unrepaired)
+    genai = load_genai(api_key)
+    model_name = select_report_model()
+    model = genai.GenerativeModel(model_name)
+
+    def generate(prompt):
+        start = time.monotonic()
+        response = model.generate_content(prompt, request_options={'timeout': 600})
+        record_gemini_usage(paper, 'repair', model_name, getattr(response, 'usage_metadata', None),
+                            time.monotonic() - start)
+        return extract_gemini_content(response)
+
+    try:
+        return report_repair.repair_report(html_content, cleaned_text, metadata, generate)
+    except Exception as e:
+        print(f"\n[错误] 局部修复报告时出错: {e}")
+        return unrepaired, report_repair.validate_report(unrepaired)
+
 # =================== 主流程 (MODIFIED LOGIC) ===================
+def process_pdf(pdf_path, store, duplicate_index):
+    """处理单个PDF：提取、查重、元数据、清理、生成报告与侧车。
+
+    返回 True 表示论文已有可用报告（包括跳过与重复链接），False 表示本次处理失败。
+    """
+    # 以PDF内容哈希为键；已有报告的论文直接跳过，只处理新增或变化的PDF
+    pdf_hash = artifact_store.file_sha256(pdf_path)
+    if store.has(pdf_hash, artifact_store.KIND_REPORT_HTML):
+        print(f"   跳过，产物库中已有报告: {store.base_name(pdf_hash)}")
+        return True
+    if store.has(pdf_hash, artifact_store.KIND_DUPLICATE_OF):
+        print(f"   跳过，已链接到重复论文的报告: {store.get(pdf_hash, artifact_store.KIND_DUPLICATE_OF)}")
+        return True
+
+    raw_text = extract_text_with_pdftotext(pdf_path)
+    if not raw_text:
+        print(f"   跳过，文本提取失败。")
+        return False
+
+    # 在花费任何 Gemini 调用之前，先检查是否与已有论文近似重复
+    cleaned_text = clean_hss_paper_text(raw_text)
+    signature = near_duplicates.minhash_signature(cleaned_text)
+    duplicate = duplicate_index.query(signature=signature)
+    if duplicate:
+        existing_name, similarity = duplicate
+        print(f"   跳过，与已有论文近似重复 ({similarity:.0%}): {existing_name}")
+        store.register_paper(pdf_hash, existing_name)
+        store.put(pdf_hash, artifact_store.KIND_DUPLICATE_OF, existing_name)
+        return True
+
+    # --- 新的、更健壮的文件名生成逻辑 ---
+    sanitized_base_name = pdf_path.stem
+    print("1. 智能提取元数据...")
+    metadata = store.get_json(pdf_hash, artifact_store.KIND_METADATA)
+    if metadata is None:
+        metadata = extract_metadata_with_gemini(raw_text[:4000], paper=(pdf_hash, pdf_path.stem))
+
+    if metadata:
+        # 即使元数据不完整，也尝试构建文件名
+        author_str = metadata.get('author')
+        year_str = metadata.get('year', '__') # 如果年份找不到，用'__'替代
+        title_str = metadata.get('title', pdf_path.stem) # 如果标题找不到，用原文件名替代
+
+        author_filename_part = get_author_lastname_for_filename(author_str)
+
+        new_filename_base = f"{author_filename_part} ({year_str}) {title_str}"
+        sanitized_base_name = sanitize_filename(new_filename_base)
+        print(f"   元数据已部分或全部提取。新文件名基础: {sanitized_base_name}")
+    else:
+        print(f"   [警告] 未能自动提取元数据。将使用原始文件名: {sanitized_base_name}")
+
+    html_path = OUTPUT_HTML_FOLDER / f"{sanitized_base_name}.html"
+
+    store.register_paper(pdf_hash, sanitized_base_name)
+    store.put(pdf_hash, artifact_store.KIND_RAW_TEXT, raw_text)
+    if metadata:
+        store.put(pdf_hash, artifact_store.KIND_METADATA, metadata)
+
+    print("2. 正在保存清理后的全文...")
+    store.put(pdf_hash, artifact_store.KIND_CLEANED_TEXT, cleaned_text)
+    print(f"   清理后的全文已存入产物库: {sanitized_base_name}")
+
+    print("3. 正在生成HTML报告...")
+    paper = (pdf_hash, sanitized_base_name)
+    partial_path = partial_report_path(html_path)
+    resumed = partial_path.exists()
+    if resumed:
+        # 上次运行留下了不完整的正文：从这里局部修复续写，而不是整篇重新生成
+        print(f"   -> 从上次保留的部分输出续写: {partial_path.name}")
+        html_content = partial_path.read_text(encoding='utf-8')
+    else:
+        html_content = generate_html_report(cleaned_text, html_path, paper=paper)
+        if html_content is None and partial_path.exists():
+            # 流式输出中断时从已收到的部分续写，而不是整篇重新生成
+            print(f"   -> 从部分输出局部修复: {partial_path.name}")
+            html_content = partial_path.read_text(encoding='utf-8')
+    if html_content:
+        # 在包装为页面之前校验正文，截断的输出不会被页面外壳的 </html> 掩盖
+        html_content = site_assets.extract_report_body(html_content)
+        issues = report_repair.validate_report(html_content)
+        if issues:
+            print(f"   -> 报告结构不完整（{len(issues)} 处），开始局部修复...")
+            repaired, remaining = repair_html_report(html_content, cleaned_text, metadata, paper=paper)
+            html_content = site_assets.extract_report_body(repaired)
+            if remaining:
+                # 仍不完整的报告不发布、不写入产物库，下次运行会重新处理这篇论文
+                if resumed:
+                    partial_path.unlink(missing_ok=True)
+                    print(f"   ❌ 续写后仍有 {len(remaining)} 处问题: {remaining}，下次将整篇重新生成")
+                else:
+                    atomic_write(partial_path, html_content)
+                    print(f"   ❌ 局部修复后仍有 {len(remaining)} 处问题: {remaining}，正文已保留供下次续写: {partial_path.name}")
+                print_paper_cost(pdf_hash)
+                return False
+        html_content = site_assets.wrap_report(html_content)
+        atomic_write(html_path, html_content)
+        partial_path.unlink(missing_ok=True)
+        store.put(pdf_hash, artifact_store.KIND_REPORT_HTML, html_content)
+        store.mark_exported(pdf_hash, artifact_store.KIND_REPORT_HTML)
+        print(f"   ✅ HTML报告已保存: {html_path.name}")
+        # 生成时一并写出结构化侧车，索引构建无需再解析HTML
+        sidecar = report_extract.write_report_sidecar(html_content, sanitized_base_name, metadata)
+        store.put(pdf_hash, artifact_store.KIND_PREVIEW, sidecar['preview'])
+        store.put(pdf_hash, artifact_store.KIND_SEARCH, sidecar['search_text'])
+        duplicate_index.add(sanitized_base_name, signature=signature)
+        duplicate_index.save()
+        print_paper_cost(pdf_hash)
+        return True
+    print(f"   ❌ 未能为 {pdf_path.name} 生成HTML报告。")
+    print_paper_cost(pdf_hash)
+    return False
+
+def print_paper_cost(pdf_hash):
+    ledger = get_usage_ledger()
+    total = ledger.totals(batch_id=ledger.batch_id, scope='paper', subject=pdf_hash)
+    if total['calls']:
+        rate = total['output'] / total['seconds'] if total['seconds'] else 0.0
+        print(f"   本篇论文: {total['calls']} 次调用，输出 {total['output']} tokens，"
+              f"{rate:.1f} tokens/s，估算费用 ${total['cost']:.4f}")
+
 def main():
     INPUT_PDF_FOLDER.mkdir(exist_ok=True)
     OUTPUT_TXT_FOLDER.mkdir(exist_ok=True)
@@ -263,56 +618,45 @@ def main():
         print(f"[信息] 在 '{INPUT_PDF_FOLDER}' 中没有找到PDF文件。")
         return
     
+    print(f"找到 {len(pdf_files)} 个PDF文件，开始批量处理...")
+    process_batch(pdf_files)
+
+def process_batch(pdf_files):
+    """依次处理一批PDF：检查批次预算、导出站点文件并打印本批次的费用与生成速度。
+
+    main() 与 cli.py summarise 共用；返回未能生成报告（含因预算停止而未处理）的PDF数量。
+    """
     total_files = len(pdf_files)
-    print(f"找到 {total_files} 个PDF文件，开始批量处理...")
+    store = artifact_store.ArtifactStore()
+    duplicate_index = near_duplicates.NearDuplicateIndex()
 
+    ledger = get_usage_ledger()
+    failed = 0
     for i, pdf_path in enumerate(pdf_files):
+        if ledger.should_stop():
+            print(f"\n[预算] 本批次估算费用 ${ledger.batch_cost():.4f} 已达上限 "
+                  f"${usage_ledger.BATCH_BUDGET_USD:.2f}，剩余 {total_files - i} 个PDF留待下次处理。")
+            failed += total_files - i
+            break
         print(f"\n--- [{i+1}/{total_files}] 处理: {pdf_path.name} ---")
-        
-        raw_text = extract_text_with_pdftotext(pdf_path)
-        if not raw_text:
-            print(f"   跳过，文本提取失败。")
-            continue
-
-        # --- 新的、更健壮的文件名生成逻辑 ---
-        sanitized_base_name = pdf_path.stem
-        print("1. 智能提取元数据...")
-        metadata = extract_metadata_with_gemini(raw_text[:4000])
-        
-        if metadata:
-            # 即使元数据不完整，也尝试构建文件名
-            author_str = metadata.get('author')
-            year_str = metadata.get('year', '__') # 如果年份找不到，用'__'替代
-            title_str = metadata.get('title', pdf_path.stem) # 如果标题找不到，用原文件名替代
-
-            author_filename_part = get_author_lastname_for_filename(author_str)
-            
-            new_filename_base = f"{author_filename_part} ({year_str}) {title_str}"
-            sanitized_base_name = sanitize_filename(new_filename_base)
-            print(f"   元数据已部分或全部提取。新文件名基础: {sanitized_base_name}")
-        else:
-            print(f"   [警告] 未能自动提取元数据。将使用原始文件名: {sanitized_base_name}")
-
-        txt_path = OUTPUT_TXT_FOLDER / f"{sanitized_base_name}.txt"
-        html_path = OUTPUT_HTML_FOLDER / f"{sanitized_base_name}.html"
-        
-        # --- 后续流程不变 ---
-        print("2. 正在清理全文...")
-        cleaned_text = clean_hss_paper_text(raw_text)
-        txt_path.write_text(cleaned_text, encoding='utf-8')
-        print(f"   清理后的TXT已保存: {txt_path.name}")
-
-        print("3. 正在生成HTML报告...")
-        html_content = generate_html_report(cleaned_text)
-        if html_content:
-            html_path.write_text(html_content, encoding='utf-8')
-            print(f"   ✅ HTML报告已保存: {html_path.name}")
-        else:
-            print(f"   ❌ 未能为 {pdf_path.name} 生成HTML报告。")
+        if not process_pdf(pdf_path, store, duplicate_index):
+            failed += 1
+
+    print("\n4. 正在导出变化的站点文件...")
+    store.export_site(BASE_DIR)
+    store.close()
+    written, _ = site_assets.compress_site(BASE_DIR)
+    print(f"   预压缩副本: 写出 {written} 个")
 
     print(f"\n--- 所有任务完成 ---")
+    if REPORT_CACHE_STATS.calls:
+        print(REPORT_CACHE_STATS.summary())
+    if ledger.totals(batch_id=ledger.batch_id)['calls']:
+        print(ledger.report(ledger.batch_id))
+    ledger.close()
     print(f"TXT目录: {OUTPUT_TXT_FOLDER}")
     print(f"HTML目录: {OUTPUT_HTML_FOLDER}")
+    return failed
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
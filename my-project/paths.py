@@ -0,0 +1,22 @@
+import os
+from pathlib import Path
+
+# =================== 路径配置 ===================
+# 站点根目录（可由环境变量 PAPERBOT_BASE_DIR 覆盖），paperbot、translator 与各辅助模块共用
+BASE_DIR = Path(os.environ.get('PAPERBOT_BASE_DIR', '/workspaces/xiaoqizhangxz-arch.github.io'))
+# 翻译目录（可由 TRANSLATOR_DIR 单独覆盖）
+TRANSLATOR_DIR = Path(os.environ.get('TRANSLATOR_DIR', BASE_DIR / 'translator'))
+
+
+def atomic_write(path, data, encoding='utf-8'):
+    """先写入同目录下的临时文件再 os.replace，读者只会看到旧文件或完整的新文件。
+
+    临时文件名带进程号，多个 worker 同时写同一路径时不会共用一个临时文件。
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    if isinstance(data, str):
+        tmp_path.write_text(data, encoding=encoding)
+    else:
+        tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+
+class CacheStats:
+    """累计一次运行中各次调用的输入 token 与命中缓存的 token。"""
+
+    def __init__(self, label, unit='tokens'):
+        self.label = label
+        self.unit = unit
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, prompt_tokens, cached_tokens):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens or 0
+        self.cached_tokens += cached_tokens or 0
+
+    @property
+    def ratio(self):
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def summary(self):
+        return (f"{self.label}: {self.calls} 次调用, 输入 {self.prompt_tokens} {self.unit}, "
+                f"缓存命中 {self.cached_tokens} {self.unit} ({self.ratio:.1%})")
+
+
+class LocalPrefixCache:
+    """本地替身：模拟服务端的前缀缓存，用来在不调用 API 的情况下验证前缀是否稳定。
+
+    第一次看到的前缀被"注册"，之后每个提示词能从已注册前缀中复用的最长部分计为命中。
+    以字符数代替 token 数。
+    """
+
+    def __init__(self):
+        self.prefixes = []
+        self.stats = CacheStats("本地前缀缓存", unit="字符")
+
+    def submit(self, parts):
+        prompt = ''.join(parts)
+        hit = 0
+        for prefix in self.prefixes:
+            if prompt.startswith(prefix):
+                hit = max(hit, len(prefix))
+        if parts and parts[0] not in self.prefixes:
+            self.prefixes.append(parts[0])
+        self.stats.record(len(prompt), hit)
+        return hit
+
+
+def verify_prefix_reuse(build_prompt, samples):
+    """用若干样本构建提示词并送入本地替身，返回 CacheStats。
+
+    build_prompt 需返回 [静态前缀, 动态部分, ...]；若静态前缀随样本变化，命中率会明显下降。
+    """
+    cache = LocalPrefixCache()
+    for sample in samples:
+        cache.submit(build_prompt(sample))
+    return cache.stats
+
+
+if __name__ == '__main__':
+    # 用 cleaned_txts 中的几篇论文验证 paperbot 报告提示词的静态前缀是否一致
+    import paperbot
+
+    txt_folder = Path(sys.argv[1]) if len(sys.argv) > 1 else paperbot.OUTPUT_TXT_FOLDER
+    samples = [p.read_text(encoding='utf-8') for p in sorted(txt_folder.glob('*.txt'))[:5]]
+    if not samples:
+        print(f"在 {txt_folder} 中没有找到样本文本。")
+        sys.exit(1)
+    stats = verify_prefix_reuse(paperbot.build_report_prompt, samples)
+    prefix_chars = len(paperbot.PAPERBOT_PROMPT_PREFIX)
+    print(f"静态前缀长度: {prefix_chars} 字符")
+    print(stats.summary())
+    # 除第一次注册外，每次调用都应完整命中静态前缀
+    expected = prefix_chars * (len(samples) - 1)
+    print("✅ 前缀稳定" if stats.cached_tokens == expected else "❌ 前缀在调用之间发生了变化")
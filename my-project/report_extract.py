@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import sys
+from html.parser import HTMLParser
+from pathlib import Path
+
+from paths import BASE_DIR, atomic_write
+
+# =================== 路径配置 ===================
+OUTPUT_HTML_FOLDER = BASE_DIR / 'summary_htmls'
+# 每份报告对应一个小的 JSON 侧车文件，供 generate_index.py 直接读取
+OUTPUT_META_FOLDER = BASE_DIR / 'summary_meta'
+
+# 首页论点预览的最大字符数（超出部分以 "..." 结尾）
+PREVIEW_LENGTH = 250
+
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4')
+SKIP_TAGS = ('style', 'script')
+
+
+class _ReportParser(HTMLParser):
+    """一次遍历收集报告的标题、作者、各级标题及各 <h3> 小节的正文。"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.text_parts = []
+        self.headings = []
+        self.sections = {}
+        self.title = ""
+        self.author = ""
+        self._skip_depth = 0
+        self._heading = None
+        self._heading_text = []
+        self._in_author = False
+        self._author_text = []
+        self._current_h3 = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in HEADING_TAGS:
+            self._heading = tag
+            self._heading_text = []
+        elif tag == 'p' and 'author' in (dict(attrs).get('class') or '').split():
+            self._in_author = True
+            self._author_text = []
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == self._heading:
+            text = _collapse(''.join(self._heading_text))
+            self.headings.append({'level': int(tag[1]), 'text': text})
+            if tag == 'h1' and not self.title:
+                self.title = text
+            if tag == 'h3':
+                self._current_h3 = text
+                self.sections.setdefault(text, [])
+            elif tag == 'h2':
+                self._current_h3 = None
+            self._heading = None
+        elif tag == 'p' and self._in_author:
+            self.author = _collapse(''.join(self._author_text))
+            self._in_author = False
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self.text_parts.append(data)
+        if self._heading:
+            self._heading_text.append(data)
+        elif self._in_author:
+            self._author_text.append(data)
+        elif self._current_h3 is not None:
+            self.sections[self._current_h3].append(data)
+
+
+def _collapse(text):
+    return ' '.join(text.split())
+
+
+def extract_report_structure(html_content):
+    """从 HTML 报告中提取结构化信息（元数据、论点、章节标题、纯文本）。"""
+    parser = _ReportParser()
+    parser.feed(html_content)
+    parser.close()
+
+    # <title> 位于 <head> 中，也计入纯文本，与旧版 search_data.json 的内容保持一致
+    plain_text = _collapse(' '.join(parser.text_parts))
+
+    argument = ""
+    for heading, parts in parser.sections.items():
+        if re.search(r'论点|Argument', heading, re.IGNORECASE):
+            argument = _collapse(' '.join(parts))
+            break
+
+    return {
+        'title': parser.title,
+        'author': parser.author,
+        'headings': parser.headings,
+        'argument': argument,
+        'text': plain_text,
+    }
+
+
+def build_preview(argument):
+    if len(argument) > PREVIEW_LENGTH:
+        return argument[:PREVIEW_LENGTH] + '...'
+    return argument
+
+
+def write_report_sidecar(html_content, base_name, metadata=None, meta_folder=OUTPUT_META_FOLDER):
+    """生成并写入 `<base_name>.json` 侧车文件，返回其内容。"""
+    structure = extract_report_structure(html_content)
+    sidecar = {
+        'base_name': base_name,
+        'href': f"summary_htmls/{base_name}.html",
+        'metadata': metadata or {},
+        'title': structure['title'],
+        'author': structure['author'],
+        'headings': structure['headings'],
+        'argument': structure['argument'],
+        'preview': build_preview(structure['argument']),
+        'search_text': structure['text'].lower(),
+    }
+    meta_folder = Path(meta_folder)
+    meta_folder.mkdir(parents=True, exist_ok=True)
+    out_path = meta_folder / f"{base_name}.json"
+    atomic_write(out_path, json.dumps(sidecar, ensure_ascii=False, indent=2))
+    return sidecar
+
+
+def backfill_sidecars(html_folder=OUTPUT_HTML_FOLDER, meta_folder=OUTPUT_META_FOLDER, force=False):
+    """为已有但缺少侧车文件（或侧车文件较旧）的报告补写侧车 JSON。"""
+    html_folder, meta_folder = Path(html_folder), Path(meta_folder)
+    written = 0
+    for html_path in sorted(html_folder.glob('*.html')):
+        meta_path = meta_folder / f"{html_path.stem}.json"
+        if not force and meta_path.exists() and meta_path.stat().st_mtime >= html_path.stat().st_mtime:
+            continue
+        write_report_sidecar(html_path.read_text(encoding='utf-8'), html_path.stem, meta_folder=meta_folder)
+        written += 1
+        print(f"  -> 已生成侧车: {meta_path.name}")
+    return written
+
+
+if __name__ == '__main__':
+    count = backfill_sidecars(force='--force' in sys.argv)
+    print(f"完成，共写入 {count} 个侧车文件: {OUTPUT_META_FOLDER}")
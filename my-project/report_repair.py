@@ -0,0 +1,296 @@
+import html
+import json
+import os
+import re
+import sys
+from html.parser import HTMLParser
+from pathlib import Path
+
+import site_assets
+from paths import BASE_DIR
+
+# =================== 路径配置 ===================
+OUTPUT_TXT_FOLDER = BASE_DIR / 'cleaned_txts'
+OUTPUT_HTML_FOLDER = BASE_DIR / 'summary_htmls'
+OUTPUT_META_FOLDER = BASE_DIR / 'summary_meta'
+
+# 报告模板要求的五个概要小节：(完整标题, 用于匹配的关键词)
+SUMMARY_SECTIONS = [
+    ('1. 论点 (Argument)', '论点'),
+    ('2. 论据 (Evidence)', '论据'),
+    ('3. 论证过程 (Reasoning Process)', '论证过程'),
+    ('4. 方法 (Method)', '方法'),
+    ('5. 案例 (Case/Example)', '案例'),
+]
+SUMMARY_HEADING = '全文概要总结'
+TABLES_HEADING = '分章节表格化细部分析'
+# 小节正文少于该字符数视为缺失
+MIN_SECTION_CHARS = 20
+
+# =================== 局部修复 Prompts ===================
+SECTION_REPAIR_PROMPT = """
+你是该论文所属领域的资深专家。下面是一篇学术文章的全文。请只撰写深度分析报告中"全文概要总结"部分的以下小节：
+
+{section_titles}
+
+要求：
+1. 只输出这些小节的HTML片段，每个小节以 <h3>小节标题</h3> 开头（标题与上面完全一致），后接一个或多个 <p> 段落。
+2. 不要输出 <html>、<head>、<body>、markdown 代码围栏或任何解释。
+
+文章全文：
+---
+{article_text}
+---
+"""
+
+TABLES_CONTINUATION_PROMPT = """
+你是该论文所属领域的资深专家，正在为下面的学术文章撰写"分章节表格化细部分析"。此前的输出在中途被截断。
+{done_note}
+请从尚未覆盖的章节开始，为每个剩余章节生成一个独立的HTML表格，直到文章结束。
+
+表格规则：
+- 表头两列依次为"大意、细节与原文引用 (Main Idea, Details & Original Quotes)"与"引用的文献 (按论点主题分类) (Cited Literature (Categorized by Argument Theme))"。
+- 每个 <tr> 有且仅有两个 <td>；原文引用用 <blockquote> 放在第一列的 <li> 中；第二列使用 <h4 class="argument-theme"> 主题标题和文献列表。
+- 只输出 <table> 片段，不要输出 <html>、<body>、markdown 代码围栏或任何解释。
+
+文章全文：
+---
+{article_text}
+---
+"""
+
+TABLE_FIX_PROMPT = """
+下面的HTML表格中有些 <tr> 的 <td> 数量不是两个。请在不改动内容的前提下修正它：
+每个 <tr> 最多有两个 <td>（跨两列的章节标题行可以是一个带 colspan="2" 的 <td>）；
+多出的列中的原文引用应以 <blockquote> 并入第一列对应的 <li> 中。
+只输出修正后的 <table> 片段，不要输出任何解释或代码围栏。
+
+{table_html}
+"""
+
+
+# =================== 结构校验 ===================
+class _TableRowParser(HTMLParser):
+    """统计每个表格中每一行的单元格数量。"""
+
+    def __init__(self):
+        super().__init__()
+        self.tables = []
+        self._row = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self.tables.append([])
+        elif tag == 'tr' and self.tables:
+            self._row = {'td': 0}
+        elif tag == 'td' and self._row is not None:
+            self._row['td'] += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'tr' and self._row is not None:
+            self.tables[-1].append(self._row)
+            self._row = None
+
+
+def _text(html_fragment):
+    return ' '.join(re.sub(r'<[^>]+>', ' ', html_fragment).split())
+
+
+def _tables_start(html_content):
+    """分章节部分从概要之后的第一个 <h2> 开始（各报告的章节标题不尽相同），没有时从第一个表格开始。"""
+    summary = re.search(rf'<h2[^>]*>\s*{SUMMARY_HEADING}', html_content)
+    search_from = summary.end() if summary else 0
+    match = re.search(r'<h2|<table', html_content[search_from:], re.I)
+    return search_from + match.start() if match else -1
+
+
+def split_report(html_content):
+    """把报告拆成可独立替换的部分；缺失的部分为 None。
+
+    tables_html 原样保留分章节部分直到最后一个完整闭合的 </table>（含章节之间的标题），
+    截断的最后一个表格被丢弃，交由续写补全。
+    """
+    parts = {'title': None, 'author': None, 'summary_intro': '', 'sections': {},
+             'tables_html': '', 'tables': []}
+
+    title = re.search(r'<h1[^>]*>.*?</h1>', html_content, re.S | re.I)
+    if title and _text(title.group(0)):
+        parts['title'] = title.group(0)
+    author = re.search(r'<p[^>]*class="author"[^>]*>.*?</p>', html_content, re.S | re.I)
+    if author and _text(author.group(0)):
+        parts['author'] = author.group(0)
+
+    tables_at = _tables_start(html_content)
+    summary_html = html_content if tables_at < 0 else html_content[:tables_at]
+    intro = re.search(rf'<h2[^>]*>\s*{SUMMARY_HEADING}\s*</h2>(.*?)(?=<h3)', summary_html, re.S)
+    if intro:
+        parts['summary_intro'] = intro.group(1).strip()
+    for full_title, keyword in SUMMARY_SECTIONS:
+        match = re.search(rf'<h3[^>]*>[^<]*{keyword}[^<]*</h3>(.*?)(?=<h3|<h2|</div>|$)', summary_html, re.S)
+        if match and len(_text(match.group(1))) >= MIN_SECTION_CHARS:
+            parts['sections'][full_title] = match.group(0).strip()
+
+    if tables_at >= 0:
+        tail = html_content[tables_at:]
+        last_close = tail.lower().rfind('</table>')
+        if last_close >= 0:
+            parts['tables_html'] = tail[:last_close + len('</table>')]
+            parts['tables'] = re.findall(r'<table.*?</table>', parts['tables_html'], re.S | re.I)
+    return parts
+
+
+def validate_report(html_content):
+    """检查报告模板要求的结构，返回问题列表；空列表表示结构完整。
+
+    问题的形式为 (类型, 详情)：header / summary_section / tables_missing / truncated / bad_table。
+    """
+    parts = split_report(html_content)
+    issues = []
+    if parts['title'] is None or parts['author'] is None:
+        issues.append(('header', None))
+    for full_title, _ in SUMMARY_SECTIONS:
+        if full_title not in parts['sections']:
+            issues.append(('summary_section', full_title))
+    if not parts['tables']:
+        issues.append(('tables_missing', None))
+    elif (html_content.count('<table') != html_content.count('</table>')
+          or not re.search(r'</div>\s*$', site_assets.extract_report_body(html_content), re.I)):
+        # 看正文（<body> 内）是否以 .container 的 </div> 收尾：包装后的页面总以 </html> 结尾，
+        # 流式输出在某个完整的 </table> 之后中断时，只有正文能暴露截断
+        issues.append(('truncated', None))
+    for index, table in enumerate(parts['tables']):
+        parser = _TableRowParser()
+        parser.feed(table)
+        rows = parser.tables[0] if parser.tables else []
+        # 没有引用文献的行只有一个 <td>，可以正常显示；多出的列才是模板被破坏（如引用被拆成第三列）
+        if any(row['td'] > 2 for row in rows):
+            issues.append(('bad_table', index))
+    return issues
+
+
+# =================== 局部修复 ===================
+def _strip_fences(text):
+    text = re.sub(r'^\s*```(?:html)?\s*\n', '', text or '', flags=re.I)
+    return re.sub(r'\n?```\s*$', '', text).strip()
+
+
+def _covered_chapters(tables_html):
+    """已完成部分覆盖到的章节标题（表格之间的 <h2>/<h3> 或跨两列的章节标题行）。"""
+    titles = re.findall(r'<h[23][^>]*>.*?</h[23]>|<td[^>]*colspan="2"[^>]*>.*?</td>', tables_html, re.S | re.I)
+    return [t for t in map(_text, titles) if t]
+
+
+def repair_report(html_content, article_text, metadata, generate):
+    """只重新生成缺失或损坏的部分并拼回报告，返回 (修复后的HTML, 剩余问题)。
+
+    generate(prompt) -> str 负责实际的模型调用。输入可以是完整页面或只有正文的部分输出，
+    修复后的报告统一包装为引用共享样式表的页面。
+    """
+    issues = validate_report(html_content)
+    if not issues:
+        return html_content, []
+    parts = split_report(html_content)
+    metadata = metadata or {}
+
+    # 标题与作者直接来自元数据，无需调用模型
+    if parts['title'] is None:
+        parts['title'] = f"<h1>{html.escape(metadata.get('title') or '')}</h1>"
+    if parts['author'] is None:
+        parts['author'] = f"<p class=\"author\">{html.escape(metadata.get('author') or '')}</p>"
+
+    missing = [detail for kind, detail in issues if kind == 'summary_section']
+    if missing:
+        print(f"   -> 重新生成缺失的概要小节: {', '.join(missing)}")
+        fragment = _strip_fences(generate(SECTION_REPAIR_PROMPT.format(
+            section_titles='\n'.join(missing), article_text=article_text)))
+        regenerated = split_report(f"<h2>{SUMMARY_HEADING}</h2>{fragment}")['sections']
+        for title in missing:
+            if title in regenerated:
+                parts['sections'][title] = regenerated[title]
+
+    for kind, index in issues:
+        if kind == 'bad_table':
+            print(f"   -> 修正第 {index + 1} 个表格的列结构")
+            original = parts['tables'][index]
+            fixed = _strip_fences(generate(TABLE_FIX_PROMPT.format(table_html=original)))
+            if fixed.startswith('<table'):
+                parts['tables_html'] = parts['tables_html'].replace(original, fixed, 1)
+                parts['tables'][index] = fixed
+
+    if any(kind in ('tables_missing', 'truncated') for kind, _ in issues):
+        covered = _covered_chapters(parts['tables_html'])
+        if covered:
+            done_note = "以下章节的表格已经完成，不要重复：\n" + '\n'.join(f"- {t}" for t in covered)
+        elif parts['tables']:
+            done_note = f"已经完成了前 {len(parts['tables'])} 个章节的表格，不要重复。"
+        else:
+            done_note = "目前还没有任何章节表格。"
+        print(f"   -> 续写章节表格（已有 {len(parts['tables'])} 个完整表格）")
+        fragment = _strip_fences(generate(TABLES_CONTINUATION_PROMPT.format(
+            done_note=done_note, article_text=article_text)))
+        continuation = re.findall(r'<h[23][^>]*>.*?</h[23]>|<table.*?</table>', fragment, re.S | re.I)
+        if continuation:
+            if not parts['tables_html']:
+                parts['tables_html'] = f"<h2>{TABLES_HEADING}</h2>"
+            parts['tables_html'] += '\n\n        ' + '\n\n        '.join(continuation)
+
+    repaired = site_assets.wrap_report(assemble_report(parts))
+    return repaired, validate_report(repaired)
+
+
+def assemble_report(parts):
+    """按模板顺序拼出报告正文（<div class="container"> ... </div>）。"""
+    sections = '\n\n            '.join(parts['sections'][t] for t, _ in SUMMARY_SECTIONS if t in parts['sections'])
+    intro = f"\n            {parts['summary_intro']}\n" if parts['summary_intro'] else ''
+    return f"""<div class="container">
+        {parts['title']}
+        {parts['author']}
+
+        <div class="summary-section">
+            <h2>{SUMMARY_HEADING}</h2>{intro}
+            {sections}
+        </div>
+
+        {parts['tables_html']}
+
+    </div>"""
+
+
+def _print_issues(name, issues):
+    print(f"{name}")
+    for kind, detail in issues:
+        print(f"    - {kind}" + (f": {detail}" if detail is not None else ''))
+
+
+if __name__ == '__main__':
+    # python report_repair.py          只校验 summary_htmls 中的所有报告
+    # python report_repair.py --fix    对有问题的报告做局部修复（需要 GEMINI_API_KEY）
+    fix = '--fix' in sys.argv
+    broken = 0
+    for html_path in sorted(OUTPUT_HTML_FOLDER.glob('*.html')):
+        html_content = html_path.read_text(encoding='utf-8')
+        issues = validate_report(html_content)
+        if not issues:
+            continue
+        broken += 1
+        _print_issues(html_path.name, issues)
+        if not fix:
+            continue
+        import paperbot
+        import report_extract
+
+        txt_path = OUTPUT_TXT_FOLDER / f"{html_path.stem}.txt"
+        if not txt_path.exists():
+            print(f"    [跳过] 找不到对应的全文: {txt_path.name}")
+            continue
+        meta_path = OUTPUT_META_FOLDER / f"{html_path.stem}.json"
+        metadata = json.loads(meta_path.read_text(encoding='utf-8')).get('metadata') if meta_path.exists() else None
+        if not metadata:
+            # 文件名形如 "作者 (年份) 标题"
+            match = re.match(r'(.*?) \((\w+)\) (.*)', html_path.stem)
+            metadata = {'author': match.group(1), 'year': match.group(2), 'title': match.group(3)} if match else {}
+        repaired, remaining = paperbot.repair_html_report(html_content, txt_path.read_text(encoding='utf-8'), metadata)
+        html_path.write_text(repaired, encoding='utf-8')
+        report_extract.write_report_sidecar(repaired, html_path.stem, metadata)
+        print("    ✅ 已修复" if not remaining else f"    仍有 {len(remaining)} 个问题")
+    print(f"\n共 {broken} 份报告存在结构问题。")
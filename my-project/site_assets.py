@@ -0,0 +1,200 @@
+import gzip
+import html
+import os
+import re
+import sys
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # 没有安装 brotli 时只生成 .gz
+    brotli = None
+
+from paths import BASE_DIR, atomic_write
+
+# =================== 路径配置 ===================
+# 所有报告共用的样式表，相对 summary_htmls/ 引用，浏览器只需下载并缓存一次
+REPORT_CSS_PATH = BASE_DIR / 'assets' / 'report.css'
+REPORT_CSS_HREF = '../assets/report.css'
+
+# 需要生成 .gz / .br 预压缩副本的站点文件（相对站点根目录的 glob）
+COMPRESS_PATTERNS = [
+    'index.html',
+    'index_pages/*.html',
+    'index_data/*.json',
+    'index_data/*/*.json',
+    'search_data.json',
+    'summary_htmls/*.html',
+    'assets/*.css',
+    'assets/*.js',
+]
+# 太小的文件压缩后收益不大
+MIN_COMPRESS_BYTES = 1024
+COMPRESSED_SUFFIXES = ('.gz', '.br')
+
+REPORT_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>{title}</title>
+<link rel="stylesheet" href="{css_href}">
+</head>
+<body>
+{body}
+</body>
+</html>"""
+
+# 两侧的空白可以安全删除的块级标签；行内标签之间的空白会影响排版，只压缩为一个空格
+_BLOCK_TAGS = {
+    'html', 'head', 'body', 'meta', 'title', 'link', 'style', 'script', 'div', 'p', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'table', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td', 'blockquote',
+    'section', 'header', 'footer', 'nav', 'main', 'article', 'aside', 'br', 'hr', '!doctype',
+}
+# 内容原样保留的标签
+_RAW_TAGS = ('pre', 'textarea', 'script', 'style')
+_RAW_BLOCK = re.compile(r'(<(%s)\b.*?</\2\s*>)' % '|'.join(_RAW_TAGS), re.S | re.I)
+_TAG = re.compile(r'(<!--.*?-->|<[^>]+>)', re.S)
+
+
+def _tag_name(tag):
+    match = re.match(r'</?\s*([!\w-]+)', tag)
+    return match.group(1).lower() if match else ''
+
+
+def _minify_fragment(fragment):
+    tokens = _TAG.split(fragment)
+    out = []
+    for i, token in enumerate(tokens):
+        if i % 2 == 1:
+            # 删除普通注释，保留条件注释
+            if token.startswith('<!--') and not token.startswith('<!--['):
+                continue
+            out.append(token)
+            continue
+        if token.strip():
+            out.append(re.sub(r'\s+', ' ', token))
+            continue
+        if not token:
+            continue
+        prev_tag = tokens[i - 1] if i > 0 else ''
+        next_tag = tokens[i + 1] if i + 1 < len(tokens) else ''
+        if _tag_name(prev_tag) in _BLOCK_TAGS or _tag_name(next_tag) in _BLOCK_TAGS or not prev_tag or not next_tag:
+            continue
+        out.append(' ')
+    return ''.join(out)
+
+
+def minify_html(html_content):
+    """去掉注释与缩进空白；<pre>/<textarea>/<script>/<style> 的内容原样保留。"""
+    parts = _RAW_BLOCK.split(html_content)
+    out = []
+    # split 的结果按 [普通, 原样块, 标签名, 普通, ...] 排列
+    for i in range(0, len(parts), 3):
+        out.append(_minify_fragment(parts[i]))
+        if i + 1 < len(parts):
+            out.append(parts[i + 1])
+    return ''.join(out).strip()
+
+
+def extract_report_body(model_output):
+    """从模型输出中取出报告正文（<div class="container"> ... </div>）。
+
+    模型偶尔仍会输出完整文档或在开头附带说明文字，这里统一去掉。
+    """
+    body = re.search(r'<body[^>]*>(.*?)(?:</body>|$)', model_output, re.S | re.I)
+    content = body.group(1) if body else model_output
+    start = content.find('<')
+    return content[start:].strip() if start >= 0 else content.strip()
+
+
+def wrap_report(body_html, title=None):
+    """把报告正文包装为引用共享样式表的完整页面，并压缩空白。"""
+    if title is None:
+        h1 = re.search(r'<h1[^>]*>(.*?)</h1>', body_html, re.S | re.I)
+        title = html.unescape(re.sub(r'<[^>]+>', '', h1.group(1))).strip() if h1 else ''
+    page = REPORT_PAGE_TEMPLATE.format(
+        title=html.escape(title or '学术文章深度分析报告'),
+        css_href=REPORT_CSS_HREF,
+        body=body_html,
+    )
+    return minify_html(page)
+
+
+def _normalize_css(css):
+    return ' '.join(css.split())
+
+
+def convert_legacy_report(html_content, shared_css=None):
+    """把内联了与 report.css 相同 <style> 的旧报告改为引用共享样式表；样式不同的报告返回 None。"""
+    if shared_css is None:
+        shared_css = REPORT_CSS_PATH.read_text(encoding='utf-8')
+    style = re.search(r'<style[^>]*>(.*?)</style>', html_content, re.S | re.I)
+    if not style or _normalize_css(style.group(1)) != _normalize_css(shared_css):
+        return None
+    return wrap_report(extract_report_body(html_content))
+
+
+def compress_file(path):
+    """在 path 旁写出 .gz（以及安装了 brotli 时的 .br），已是最新的副本不重写。返回写出的副本数。"""
+    data = None
+    written = 0
+    mtime = path.stat().st_mtime_ns
+    for suffix in COMPRESSED_SUFFIXES:
+        if suffix == '.br' and brotli is None:
+            continue
+        target = path.with_name(path.name + suffix)
+        if target.exists() and target.stat().st_mtime_ns >= mtime:
+            continue
+        if data is None:
+            data = path.read_bytes()
+        # mtime=0 让相同内容生成逐字节相同的 .gz
+        compressed = gzip.compress(data, 9, mtime=0) if suffix == '.gz' else brotli.compress(data, quality=11)
+        atomic_write(target, compressed)
+        written += 1
+    return written
+
+
+def compress_site(base_dir=BASE_DIR):
+    """为站点文件生成预压缩副本，并删除源文件已不存在的旧副本。返回 (写出数, 删除数)。"""
+    base_dir = Path(base_dir)
+    written = removed = 0
+    for pattern in COMPRESS_PATTERNS:
+        for path in sorted(base_dir.glob(pattern)):
+            if path.stat().st_size >= MIN_COMPRESS_BYTES:
+                written += compress_file(path)
+        for suffix in COMPRESSED_SUFFIXES:
+            for sibling in base_dir.glob(pattern + suffix):
+                if not sibling.with_suffix('').exists():
+                    sibling.unlink()
+                    removed += 1
+    if brotli is None:
+        print("   [提示] 未安装 brotli，只生成了 .gz 副本。")
+    return written, removed
+
+
+def migrate_reports(html_folder):
+    """把 summary_htmls 中内联样式的旧报告改为共享样式表 + 压缩空白，返回 (转换数, 节省字节数)。"""
+    shared_css = REPORT_CSS_PATH.read_text(encoding='utf-8')
+    converted = saved = 0
+    for html_path in sorted(Path(html_folder).glob('*.html')):
+        original = html_path.read_text(encoding='utf-8')
+        page = convert_legacy_report(original, shared_css)
+        if page is None:
+            if '<style' in original:
+                print(f"   [跳过] 样式与 report.css 不一致: {html_path.name}")
+            continue
+        html_path.write_text(page, encoding='utf-8')
+        converted += 1
+        saved += len(original.encode('utf-8')) - len(page.encode('utf-8'))
+    return converted, saved
+
+
+if __name__ == '__main__':
+    # python site_assets.py              为站点文件生成 .gz/.br 预压缩副本
+    # python site_assets.py --migrate    先把旧报告改为共享样式表，再生成副本
+    if '--migrate' in sys.argv:
+        converted, saved = migrate_reports(BASE_DIR / 'summary_htmls')
+        print(f"已转换 {converted} 份报告，共节省 {saved / 1024:.0f} KB")
+    written, removed = compress_site(BASE_DIR)
+    print(f"预压缩副本: 写出 {written} 个，删除 {removed} 个过期副本")
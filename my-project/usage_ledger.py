@@ -0,0 +1,182 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from paths import BASE_DIR
+
+# =================== 配置 ===================
+LEDGER_PATH = Path(os.environ.get('PAPERBOT_USAGE_DB', BASE_DIR / 'usage.sqlite3'))
+
+# 一个批次 = 一次 paperbot / translator 运行，或一次 job_queue work 启动的所有 worker
+BATCH_ID = os.environ.get('PAPERBOT_BATCH_ID') or time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+# 每批次预算（美元），0 表示不限
+BATCH_BUDGET_USD = float(os.environ.get('PAPERBOT_BATCH_BUDGET_USD', '0'))
+# 超出预算后：downgrade 把 Gemini 报告生成切换到 CHEAP_GEMINI_MODEL；stop 停止领取新的论文/书籍
+BUDGET_ACTION = os.environ.get('PAPERBOT_BUDGET_ACTION', 'downgrade')
+CHEAP_GEMINI_MODEL = "models/gemini-2.5-flash"
+
+# 每百万 token 的美元价格：(未命中缓存的输入, 命中缓存的输入, 输出)，按官方价目表估算，
+# 价格调整时可用 PAPERBOT_PRICES='{"gemini-2.5-pro": [1.25, 0.125, 10.0]}' 覆盖
+PRICES = {
+    'gemini-2.5-pro': (1.25, 0.125, 10.0),
+    'gemini-2.5-flash': (0.30, 0.03, 2.50),
+    'deepseek-chat': (0.28, 0.028, 0.42),
+}
+PRICES.update({k: tuple(v) for k, v in json.loads(os.environ.get('PAPERBOT_PRICES', '{}')).items()})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id            INTEGER PRIMARY KEY,
+    batch_id      TEXT NOT NULL,
+    scope         TEXT NOT NULL,      -- paper / book
+    subject       TEXT NOT NULL,      -- 论文为 PDF 内容哈希，书籍为书名
+    label         TEXT,               -- 显示用名称
+    provider      TEXT NOT NULL,
+    model         TEXT NOT NULL,
+    purpose       TEXT NOT NULL,
+    input_tokens  INTEGER NOT NULL,
+    cached_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    seconds       REAL NOT NULL,
+    cost_usd      REAL NOT NULL,
+    created_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_calls_batch ON calls(batch_id);
+CREATE INDEX IF NOT EXISTS idx_calls_subject ON calls(scope, subject);
+"""
+
+
+def _price(model):
+    return PRICES.get(model.removeprefix('models/'))
+
+
+def estimate_cost(model, input_tokens, cached_tokens, output_tokens):
+    """输入 token 数包含命中缓存的部分（Gemini 与 DeepSeek 的统计口径相同）。未知模型返回 0。"""
+    price = _price(model)
+    if price is None:
+        return 0.0
+    uncached = max((input_tokens or 0) - (cached_tokens or 0), 0)
+    return (uncached * price[0] + (cached_tokens or 0) * price[1] + (output_tokens or 0) * price[2]) / 1_000_000
+
+
+def gemini_usage(usage_metadata):
+    """从 Gemini 的 usage_metadata 取 (输入, 缓存命中, 输出)；2.5 系列的思考 token 按输出计费。"""
+    if usage_metadata is None:
+        return 0, 0, 0
+    output = (getattr(usage_metadata, 'candidates_token_count', 0) or 0) + \
+             (getattr(usage_metadata, 'thoughts_token_count', 0) or 0)
+    return (getattr(usage_metadata, 'prompt_token_count', 0) or 0,
+            getattr(usage_metadata, 'cached_content_token_count', 0) or 0,
+            output)
+
+
+def deepseek_usage(usage):
+    """从 DeepSeek（OpenAI 兼容）响应的 usage 取 (输入, 缓存命中, 输出)。"""
+    if usage is None:
+        return 0, 0, 0
+    return (getattr(usage, 'prompt_tokens', 0) or 0,
+            getattr(usage, 'prompt_cache_hit_tokens', 0) or 0,
+            getattr(usage, 'completion_tokens', 0) or 0)
+
+
+class UsageLedger:
+    """记录每次模型调用的 token 与估算费用，并按论文、书籍、批次汇总。
+
+    多个 worker 进程写同一个数据库，批次预算因此在进程之间共享。
+    """
+
+    def __init__(self, path=LEDGER_PATH, batch_id=BATCH_ID):
+        self.batch_id = batch_id
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, scope, subject, provider, model, purpose, input_tokens, cached_tokens, output_tokens,
+               seconds, label=None):
+        cost = estimate_cost(model, input_tokens, cached_tokens, output_tokens)
+        self.conn.execute(
+            "INSERT INTO calls (batch_id, scope, subject, label, provider, model, purpose, input_tokens, "
+            "cached_tokens, output_tokens, seconds, cost_usd, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.batch_id, scope, subject, label or subject, provider, model, purpose, input_tokens or 0,
+             cached_tokens or 0, output_tokens or 0, seconds, cost, time.time()),
+        )
+        return cost
+
+    def totals(self, batch_id=None, scope=None, subject=None):
+        """返回 {calls, input, cached, output, seconds, cost}，不带条件时为全部调用。"""
+        where, params = [], []
+        for column, value in (('batch_id', batch_id), ('scope', scope), ('subject', subject)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        row = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(input_tokens), 0), COALESCE(SUM(cached_tokens), 0), "
+            "COALESCE(SUM(output_tokens), 0), COALESCE(SUM(seconds), 0), COALESCE(SUM(cost_usd), 0) FROM calls"
+            + (" WHERE " + " AND ".join(where) if where else ''),
+            params,
+        ).fetchone()
+        return dict(zip(('calls', 'input', 'cached', 'output', 'seconds', 'cost'), row))
+
+    def batch_cost(self):
+        return self.totals(batch_id=self.batch_id)['cost']
+
+    def over_budget(self):
+        return BATCH_BUDGET_USD > 0 and self.batch_cost() >= BATCH_BUDGET_USD
+
+    def should_stop(self):
+        return BUDGET_ACTION == 'stop' and self.over_budget()
+
+    def gemini_model(self, preferred):
+        """预算用尽且策略为 downgrade 时返回更便宜的模型，否则返回 preferred。"""
+        if BUDGET_ACTION == 'downgrade' and preferred != CHEAP_GEMINI_MODEL and self.over_budget():
+            return CHEAP_GEMINI_MODEL
+        return preferred
+
+    def subject_rows(self, batch_id=None):
+        """按论文/书籍汇总：[(scope, label, calls, input, cached, output, seconds, cost), ...]。"""
+        # 显示名称取最近一次调用的（论文在提取元数据后才确定文件名）
+        return self.conn.execute(
+            "SELECT scope, (SELECT label FROM calls AS last WHERE last.scope = calls.scope "
+            "AND last.subject = calls.subject ORDER BY last.id DESC LIMIT 1), "
+            "COUNT(*), SUM(input_tokens), SUM(cached_tokens), SUM(output_tokens), SUM(seconds), SUM(cost_usd) "
+            "FROM calls" + (" WHERE batch_id = ?" if batch_id else '') + " GROUP BY scope, subject ORDER BY MIN(id)",
+            (batch_id,) if batch_id else (),
+        ).fetchall()
+
+    def report(self, batch_id=None):
+        """生成文本报表：每篇论文/每本书的费用与输出速度，以及合计。"""
+        lines = []
+        for scope, label, calls, input_tokens, cached, output, seconds, cost in self.subject_rows(batch_id):
+            rate = output / seconds if seconds else 0.0
+            kind = '论文' if scope == 'paper' else '书籍'
+            lines.append(f"  [{kind}] {label}: {calls} 次调用, 输入 {input_tokens} (缓存 {cached}), "
+                         f"输出 {output} tokens, {rate:.1f} tokens/s, ${cost:.4f}")
+        total = self.totals(batch_id=batch_id)
+        rate = total['output'] / total['seconds'] if total['seconds'] else 0.0
+        title = f"批次 {batch_id}" if batch_id else "全部批次"
+        lines.append(f"{title}: {total['calls']} 次调用, 输入 {total['input']} (缓存 {total['cached']}), "
+                     f"输出 {total['output']} tokens, {rate:.1f} tokens/s, 估算费用 ${total['cost']:.4f}"
+                     + (f" / 预算 ${BATCH_BUDGET_USD:.2f}" if batch_id and BATCH_BUDGET_USD > 0 else ''))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    # python usage_ledger.py              列出各批次的费用
+    # python usage_ledger.py <批次ID>     显示该批次中每篇论文/每本书的明细
+    # python usage_ledger.py --all        显示所有批次的逐项明细
+    ledger = UsageLedger()
+    if len(sys.argv) > 1:
+        print(ledger.report(None if sys.argv[1] == '--all' else sys.argv[1]))
+    else:
+        for batch_id, calls, cost, started in ledger.conn.execute(
+                "SELECT batch_id, COUNT(*), SUM(cost_usd), MIN(created_at) FROM calls "
+                "GROUP BY batch_id ORDER BY MIN(created_at)"):
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(started))}  {batch_id:<28} "
+                  f"{calls:>5} 次调用  ${cost:.4f}")
+    ledger.close()
@@ -1,6 +1,5 @@
 # /workspaces/xiaoqizhangxz-arch.github.io/scripts/fetch_papers.py
 
-import feedparser
 import os
 from datetime import datetime
 import re
@@ -45,7 +44,7 @@ RSS_FEEDS = {
 }
 
 # 3. 定义输出路径（保持不变）
-workspace_path = os.getenv('GITHUB_WORKSPACE', '/workspaces/xiaoqizhangxz-arch.github.io')
+workspace_path = os.getenv('GITHUB_WORKSPACE') or os.getenv('PAPERBOT_BASE_DIR', '/workspaces/xiaoqizhangxz-arch.github.io')
 OUTPUT_DIR = os.path.join(workspace_path, 'news')
 
 # --- 脚本主逻辑 (稍作优化，基本不变) ---
@@ -60,6 +59,8 @@ def clean_summary(summary_html):
 
 def fetch_and_filter():
     """抓取并过滤论文"""
+    import feedparser  # 只在抓取时导入
+
     print("Starting broad academic content fetch...")
     found_items = []
     seen_links = set()
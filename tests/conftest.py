@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# 测试中导入的模块在导入时读取站点根目录，指向临时目录，不会写入仓库中的站点文件
+os.environ.setdefault('PAPERBOT_BASE_DIR', tempfile.mkdtemp(prefix='paperbot-test-'))
+os.environ.setdefault('PAPERBOT_USAGE_DB', os.path.join(os.environ['PAPERBOT_BASE_DIR'], 'usage.sqlite3'))
+
+for path in (REPO_DIR, REPO_DIR / 'my-project', REPO_DIR / 'translator'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
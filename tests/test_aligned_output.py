@@ -0,0 +1,48 @@
+import pytest
+
+import aligned_output
+from aligned_output import AlignedTranslation
+
+CHUNKS = [
+    "--- Page 1 --- The Fool begins the journey.",
+    "He meets the Magician. --- Page 2 --- Then the High Priestess.",
+    "The Empress rules the garden.",
+    "--- Page 4 --- The Emperor builds the city.",
+]
+TRANSLATIONS = ["愚者踏上旅程。", "他遇见魔术师，然后是女祭司。", "皇后掌管花园。", "皇帝建造城市。"]
+
+
+@pytest.fixture
+def book(tmp_path):
+    aligned_output.write_aligned(tmp_path, 'tarot', '塔罗', CHUNKS, TRANSLATIONS)
+    return tmp_path
+
+
+def test_lookup_by_chunk_page_and_passage(book):
+    with AlignedTranslation(book, 'tarot') as aligned:
+        assert len(aligned) == 4
+        assert aligned.segment(1).translation == TRANSLATIONS[1]
+        assert [s.index for s in aligned.by_page(2)] == [1, 2]
+        assert aligned.by_page(3) == []
+        assert [s.index for s in aligned.find("The   Emperor")] == [3]
+
+
+def test_patch_in_place_and_appended_then_compact(book):
+    with AlignedTranslation(book, 'tarot', writable=True) as aligned:
+        assert aligned.patch(2, "皇后。") is True
+        assert aligned.patch(0, "愚者满怀好奇地踏上了一段漫长的旅程，" * 3) is False
+        assert aligned.segment(2).translation == "皇后。"
+        assert aligned.segment(0).translation.startswith("愚者满怀好奇")
+        aligned.compact()
+
+    expected = ["愚者满怀好奇地踏上了一段漫长的旅程，" * 3, TRANSLATIONS[1], "皇后。", TRANSLATIONS[3]]
+    with AlignedTranslation(book, 'tarot') as aligned:
+        assert [aligned.segment(i).translation for i in range(4)] == expected
+    target = aligned_output.aligned_paths(book, 'tarot')[1].read_text(encoding='utf-8')
+    assert target == aligned_output.translation_header('塔罗') + ''.join(t + '\n\n' for t in expected)
+
+
+def test_legacy_flat_translation_round_trip():
+    flat = aligned_output.translation_header('塔罗') + ''.join(
+        f"【第{i + 1}部分】\n{t}" + aligned_output.LEGACY_RULE for i, t in enumerate(TRANSLATIONS))
+    assert aligned_output.split_flat_translation(flat) == TRANSLATIONS
@@ -0,0 +1,33 @@
+import pytest
+
+from paperbot import FenceStripper
+
+
+def strip_stream(pieces):
+    stripper = FenceStripper()
+    out = ''.join(stripper.feed(piece) for piece in pieces)
+    return out + stripper.flush()
+
+
+BODY = '<div class="container">\n<h1>标题</h1>\n<p>正文</p>\n</div>'
+
+
+@pytest.mark.parametrize('text', [
+    BODY,
+    f"```html\n{BODY}\n```",
+    f"```\n{BODY}\n```\n",
+    f"  ```HTML\n{BODY}```",
+])
+def test_fences_are_removed_in_any_chunking(text):
+    for size in (1, 3, 7, 64, len(text)):
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        assert strip_stream(pieces).strip() == BODY
+
+
+def test_backticks_inside_the_body_are_kept():
+    text = "<p>使用 ``` 标记代码</p>\n<pre>```x```</pre>"
+    assert strip_stream([text[:5], text[5:]]) == text
+
+
+def test_short_stream_without_newline_is_flushed():
+    assert strip_stream(['<p>', 'x</p>']) == '<p>x</p>'
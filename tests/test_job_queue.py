@@ -0,0 +1,109 @@
+import sys
+
+import pytest
+
+import job_queue
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_queue.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = job_queue.connect(tmp_path / 'jobs.sqlite3')
+    yield conn
+    conn.close()
+
+
+def job_row(conn, job_id):
+    return conn.execute(
+        "SELECT status, worker, attempts, last_error FROM jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+
+
+def test_expired_lease_is_requeued_for_another_worker(conn, clock):
+    job_id = job_queue.enqueue(conn, 'index')
+    assert job_queue.claim(conn, 'w1')['id'] == job_id
+    assert job_queue.claim(conn, 'w2') is None
+
+    clock.now += job_queue.LEASE_SECONDS + 1
+    job = job_queue.claim(conn, 'w2')
+    assert job['id'] == job_id
+    assert job['attempts'] == 2
+    assert job_row(conn, job_id)[:2] == ('running', 'w2')
+
+
+def test_previous_owner_cannot_complete_or_fail_a_reclaimed_job(conn, clock):
+    job_id = job_queue.enqueue(conn, 'index')
+    job_queue.claim(conn, 'w1')
+    clock.now += job_queue.LEASE_SECONDS + 1
+    job_queue.claim(conn, 'w2')
+
+    with pytest.raises(job_queue.LeaseLost):
+        job_queue.complete(conn, job_id, 'w1')
+    with pytest.raises(job_queue.LeaseLost):
+        job_queue.fail(conn, job_id, 'boom', 'w1')
+    assert job_row(conn, job_id)[:2] == ('running', 'w2')
+
+    job_queue.complete(conn, job_id, 'w2')
+    assert job_row(conn, job_id)[0] == 'done'
+
+
+def test_expired_lease_with_no_attempts_left_fails_the_job(conn, clock):
+    job_id = job_queue.enqueue(conn, 'index', max_attempts=1)
+    job_queue.claim(conn, 'w1')
+
+    clock.now += job_queue.LEASE_SECONDS + 1
+    assert job_queue.claim(conn, 'w2') is None
+    status, worker, attempts, last_error = job_row(conn, job_id)
+    assert (status, worker, attempts) == ('failed', None, 1)
+    assert '租约过期' in last_error
+
+
+def test_fail_retries_with_backoff_until_attempts_are_used(conn, clock):
+    job_id = job_queue.enqueue(conn, 'index', max_attempts=2)
+    job_queue.claim(conn, 'w1')
+    assert job_queue.fail(conn, job_id, 'first', 'w1') == job_queue.RETRY_BASE_DELAY
+    assert job_queue.claim(conn, 'w1') is None
+
+    clock.now += job_queue.RETRY_BASE_DELAY
+    assert job_queue.claim(conn, 'w1')['attempts'] == 2
+    assert job_queue.fail(conn, job_id, 'second', 'w1') is None
+    assert job_row(conn, job_id)[0] == 'failed'
+
+
+def test_provider_interval_is_shared_across_workers(conn, clock, monkeypatch):
+    monkeypatch.setitem(job_queue.PROVIDER_LIMITS, 'gemini', 5)
+    monkeypatch.setitem(job_queue.PROVIDER_MIN_INTERVAL, 'gemini', 10)
+    job_queue.enqueue(conn, 'summarise', {'pdf': 'a.pdf'})
+    job_queue.enqueue(conn, 'summarise', {'pdf': 'b.pdf'})
+
+    assert job_queue.claim(conn, 'w1')['payload'] == {'pdf': 'a.pdf'}
+    assert job_queue.claim(conn, 'w2') is None
+    clock.now += 10
+    assert job_queue.claim(conn, 'w2')['payload'] == {'pdf': 'b.pdf'}
+
+
+def test_handler_calling_sys_exit_is_recorded_as_failure(tmp_path, monkeypatch):
+    path = tmp_path / 'jobs.sqlite3'
+    conn = job_queue.connect(path)
+    job_id = job_queue.enqueue(conn, 'index', max_attempts=1)
+    monkeypatch.setitem(job_queue.HANDLERS, 'index', lambda payload, conn: sys.exit(1))
+
+    job_queue.worker_loop(1, path=path, exit_when_idle=True)
+    status, _, _, last_error = job_row(conn, job_id)
+    assert status == 'failed'
+    assert last_error.startswith('SystemExit')
+    conn.close()
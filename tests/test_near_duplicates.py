@@ -0,0 +1,58 @@
+import random
+
+import near_duplicates
+from near_duplicates import NearDuplicateIndex
+
+VOCABULARY = [''.join(random.Random(i).choices('abcdefghijklmnopqrstuvwxyz', k=7)) for i in range(3000)]
+
+
+def paper(seed, words=4000):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def revised(text, seed, rate=0.03):
+    """模拟同一论文的另一个版本：少量改词，并插入页眉页码。"""
+    rng = random.Random(seed)
+    words = text.split()
+    for i in range(len(words)):
+        if rng.random() < rate:
+            words[i] = rng.choice(VOCABULARY)
+    for i in range(0, len(words), 400):
+        words.insert(i, f"Journal of Things {i // 400 + 1}")
+    return ' '.join(words)
+
+
+def test_signature_is_deterministic_and_ignores_digits_and_case():
+    text = paper(1)
+    assert near_duplicates.minhash_signature(text) == near_duplicates.minhash_signature(text)
+    assert near_duplicates.minhash_signature(text.upper() + ' 123 456') == near_duplicates.minhash_signature(text)
+
+
+def test_revised_version_is_found_and_unrelated_paper_is_not(tmp_path):
+    index = NearDuplicateIndex(tmp_path / 'index.json')
+    for seed in range(20):
+        index.add(f"paper-{seed}", text=paper(seed))
+
+    match = index.query(text=revised(paper(7), seed=99))
+    assert match is not None
+    assert match[0] == 'paper-7'
+    assert match[1] >= near_duplicates.DUPLICATE_THRESHOLD
+    assert index.query(text=paper(1000)) is None
+
+
+def test_concurrent_instances_merge_their_additions_on_save(tmp_path):
+    path = tmp_path / 'index.json'
+    first, second = NearDuplicateIndex(path), NearDuplicateIndex(path)
+    first.add('a', text=paper(1))
+    second.add('b', text=paper(2))
+    first.save()
+    second.save()
+
+    assert set(NearDuplicateIndex(path).signatures) == {'a', 'b'}
+    # 保存时也会读入其他实例写入的签名
+    assert set(second.signatures) == {'a', 'b'}
+
+    second.remove('a')
+    second.save()
+    assert set(NearDuplicateIndex(path).signatures) == {'b'}
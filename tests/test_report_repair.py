@@ -0,0 +1,47 @@
+import report_repair
+import site_assets
+
+SECTIONS = ''.join(
+    f"<h3>{title}</h3><p>{'这一小节的内容足够长，不会被视为缺失。' * 2}</p>"
+    for title, _ in report_repair.SUMMARY_SECTIONS
+)
+TABLE = ("<table><tr><th>大意</th><th>文献</th></tr>"
+         "<tr><td><ul><li>观点<blockquote>引文</blockquote></li></ul></td><td><ul><li>文献</li></ul></td></tr>"
+         "<tr><td>没有引用文献的行</td></tr></table>")
+
+
+def report(sections=SECTIONS, tables=TABLE + '<h3>第二章</h3>' + TABLE, end='</div>'):
+    return ('<div class="container"><h1>文章标题</h1><p class="author">作者</p>'
+            f'<div class="summary-section"><h2>全文概要总结</h2>{sections}</div>'
+            f'<h2>分章节表格化细部分析</h2><h3>第一章</h3>{tables}{end}')
+
+
+def kinds(issues):
+    return [kind for kind, _ in issues]
+
+
+def test_complete_report_has_no_issues():
+    assert report_repair.validate_report(report()) == []
+    assert report_repair.validate_report(site_assets.wrap_report(report())) == []
+
+
+def test_missing_summary_section_is_reported():
+    title, keyword = report_repair.SUMMARY_SECTIONS[2]
+    sections = SECTIONS.replace(f"<h3>{title}</h3>", '<h3>其他</h3>')
+    assert report_repair.validate_report(report(sections=sections)) == [('summary_section', title)]
+
+
+def test_missing_header_and_tables():
+    body = report(tables='', end='</div>').replace('<p class="author">作者</p>', '')
+    assert kinds(report_repair.validate_report(body)) == ['header', 'tables_missing']
+
+
+def test_body_cut_after_a_complete_table_is_truncated_even_when_wrapped():
+    cut = report(tables=TABLE + '<h3>第二章</h3>' + TABLE, end='')
+    assert kinds(report_repair.validate_report(cut)) == ['truncated']
+    assert kinds(report_repair.validate_report(site_assets.wrap_report(cut))) == ['truncated']
+
+
+def test_table_with_a_third_column_is_bad():
+    bad = TABLE.replace('</td></tr><tr><td>没有', '</td><td>第三列</td></tr><tr><td>没有', 1)
+    assert report_repair.validate_report(report(tables=TABLE + bad)) == [('bad_table', 1)]
@@ -0,0 +1,47 @@
+import gzip
+
+import site_assets
+
+
+def test_minify_removes_comments_and_indentation_between_blocks():
+    page = """
+    <div class="container">
+        <!-- 注释 -->
+        <h1>标题</h1>
+        <p>第一段
+           继续</p>
+    </div>
+    """
+    assert site_assets.minify_html(page) == '<div class="container"><h1>标题</h1><p>第一段 继续</p></div>'
+
+
+def test_minify_keeps_inline_spacing_conditional_comments_and_raw_blocks():
+    page = ("<p><strong>作者</strong> <em>(2020)</em></p><!--[if IE]><p>旧版</p><![endif]-->"
+            "<pre>  缩进\n  保留  </pre><style>a  { color: red; }</style>")
+    assert site_assets.minify_html(page) == page
+
+
+def test_wrap_report_links_the_shared_stylesheet_and_round_trips_the_body():
+    body = '<div class="container"><h1>A &amp; B</h1><p class="author">作者</p></div>'
+    page = site_assets.wrap_report(body)
+    assert page.startswith('<!DOCTYPE html>')
+    assert f'<link rel="stylesheet" href="{site_assets.REPORT_CSS_HREF}">' in page
+    assert '<title>A &amp; B</title>' in page
+    assert site_assets.extract_report_body(page) == body
+
+
+def test_extract_report_body_drops_preamble_text():
+    assert site_assets.extract_report_body('好的，以下是报告：\n<div class="container"></div>') == \
+        '<div class="container"></div>'
+
+
+def test_compress_file_writes_reproducible_gzip(tmp_path):
+    path = tmp_path / 'index.html'
+    path.write_text('<p>内容</p>' * 500, encoding='utf-8')
+    assert site_assets.compress_file(path) >= 1
+    first = (tmp_path / 'index.html.gz').read_bytes()
+    assert gzip.decompress(first) == path.read_bytes()
+
+    (tmp_path / 'index.html.gz').unlink()
+    site_assets.compress_file(path)
+    assert (tmp_path / 'index.html.gz').read_bytes() == first
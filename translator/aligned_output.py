@@ -0,0 +1,328 @@
+"""
+双语对齐的翻译输出：每本书写出三个文件
+
+    <书名>_source.txt      原文文本块，按块顺序排列
+    <书名>_translated.txt  中文译文，按块顺序排列（可直接阅读）
+    <书名>_aligned.idx     定长二进制索引，记录每块的源页码、原文与译文的字节偏移
+
+索引通过 mmap 读取：按块号、按页码查找都是常数时间，按原文字节偏移查找为二分查找。
+重新翻译个别文本块时只改写该块所在的字节和一条索引记录，不重写整个文件。
+
+    python aligned_output.py lookup <书名> --page 42
+    python aligned_output.py lookup <书名> --chunk 17
+    python aligned_output.py lookup <书名> --find "collective unconscious"
+    python aligned_output.py compact <书名>
+    python aligned_output.py import <书名>      # 把旧的【第N部分】平铺译文转为对齐格式
+"""
+import mmap
+import os
+import re
+import struct
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "my-project"))
+from paths import atomic_write
+
+INDEX_MAGIC = b'ALIGNIDX'
+INDEX_VERSION = 2
+# 文件头：魔数、版本、文本块数、页表长度（最大页码 + 1）、译文文件开头标题部分的字节数
+HEADER = struct.Struct('<8sIIII')
+# 每个文本块一条：起止页码、原文偏移/长度、译文偏移/长度/槽位容量（字节）
+RECORD = struct.Struct('<IIQIQII')
+# 页表：每页对应的第一个与最后一个文本块
+PAGE = struct.Struct('<II')
+NO_CHUNK = 0xFFFFFFFF
+
+SEPARATOR = b'\n\n'
+# extract_pdf_text 写入的页码标记
+PAGE_MARKER = re.compile(r'--- Page (\d+) ---')
+# 旧版 save_translation 的分隔格式
+LEGACY_PART = re.compile(r'^【第(\d+)部分】\n', re.M)
+LEGACY_RULE = "\n\n" + "-" * 40 + "\n\n"
+
+Segment = namedtuple('Segment', 'index page_start page_end source translation')
+
+
+def aligned_paths(translation_dir, name):
+    """返回 (原文文件, 译文文件, 索引文件) 的路径。"""
+    translation_dir = Path(translation_dir)
+    return (translation_dir / f"{name}_source.txt",
+            translation_dir / f"{name}_translated.txt",
+            translation_dir / f"{name}_aligned.idx")
+
+
+def translation_header(book_title):
+    return f"《{book_title}》中文翻译\n" + "=" * 50 + "\n\n"
+
+
+def chunk_pages(chunks):
+    """根据块内的页码标记推算每块的 (起始页, 结束页)；块没有以标记开头时沿用上一块的结束页。"""
+    pages = []
+    current = 0
+    for chunk in chunks:
+        markers = [int(m) for m in PAGE_MARKER.findall(chunk)]
+        start = markers[0] if markers and PAGE_MARKER.match(chunk.lstrip()) else current
+        end = markers[-1] if markers else start
+        pages.append((start, end))
+        current = end
+    return pages
+
+
+def write_aligned(translation_dir, name, book_title, chunks, translations, header=None):
+    """写出原文、译文与索引三个文件，返回译文文件路径。header 为译文文件开头的字节，默认按书名生成。"""
+    if len(chunks) != len(translations):
+        raise ValueError(f"原文 {len(chunks)} 块与译文 {len(translations)} 块数量不一致")
+    source_path, target_path, index_path = aligned_paths(translation_dir, name)
+    pages = chunk_pages(chunks)
+
+    source = bytearray()
+    target = bytearray(header if header is not None else translation_header(book_title).encode('utf-8'))
+    header_len = len(target)
+    records = []
+    for (page_start, page_end), chunk, translation in zip(pages, chunks, translations):
+        src = chunk.encode('utf-8')
+        tgt = translation.encode('utf-8')
+        records.append((page_start, page_end, len(source), len(src), len(target), len(tgt), len(tgt)))
+        source += src + SEPARATOR
+        target += tgt + SEPARATOR
+
+    page_count = max((end for _, end in pages), default=0) + 1
+    page_table = [[NO_CHUNK, NO_CHUNK] for _ in range(page_count)]
+    for i, (page_start, page_end) in enumerate(pages):
+        for page in range(page_start, page_end + 1):
+            if page_table[page][0] == NO_CHUNK:
+                page_table[page][0] = i
+            page_table[page][1] = i
+
+    index = bytearray(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(records), page_count, header_len))
+    for record in records:
+        index += RECORD.pack(*record)
+    for first, last in page_table:
+        index += PAGE.pack(first, last)
+
+    # 索引最后写入：中途失败时旧索引仍与旧文件一致，或缺失而不会指向错误位置
+    atomic_write(source_path, bytes(source))
+    atomic_write(target_path, bytes(target))
+    atomic_write(index_path, bytes(index))
+    return target_path
+
+
+def split_flat_translation(text):
+    """把旧版【第N部分】平铺译文拆回按块排列的译文列表。"""
+    parts = LEGACY_PART.split(text)
+    # split 结果为 [文件头, 序号, 内容, 序号, 内容, ...]
+    translations = []
+    for i in range(1, len(parts), 2):
+        body = parts[i + 1]
+        if body.endswith(LEGACY_RULE):
+            body = body[:-len(LEGACY_RULE)]
+        translations.append(body)
+    return translations
+
+
+def _map(f):
+    size = os.fstat(f.fileno()).st_size
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+
+class AlignedTranslation:
+    """按块号、页码或原文位置查找译文，并支持原地替换个别文本块的译文。"""
+
+    def __init__(self, translation_dir, name, writable=False):
+        self.translation_dir = Path(translation_dir)
+        self.name = name
+        self.writable = writable
+        self.source_path, self.target_path, self.index_path = aligned_paths(translation_dir, name)
+        mode = 'r+b' if writable else 'rb'
+        self._index_file = open(self.index_path, mode)
+        self._source_file = open(self.source_path, 'rb')
+        self._target_file = open(self.target_path, mode)
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=access)
+        magic, version, self.chunk_count, self.page_count, self.header_len = HEADER.unpack_from(self._index, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise ValueError(f"不是有效的对齐索引: {self.index_path}")
+        self._pages_at = HEADER.size + self.chunk_count * RECORD.size
+        self._source = _map(self._source_file)
+        self._target = _map(self._target_file)
+
+    def close(self):
+        for m in (getattr(self, '_index', None), getattr(self, '_source', None), getattr(self, '_target', None)):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for f in (self._index_file, self._source_file, self._target_file):
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.chunk_count
+
+    def _record(self, index):
+        if not 0 <= index < self.chunk_count:
+            raise IndexError(f"文本块序号超出范围: {index}（共 {self.chunk_count} 块）")
+        return RECORD.unpack_from(self._index, HEADER.size + index * RECORD.size)
+
+    def segment(self, index):
+        page_start, page_end, src_off, src_len, tgt_off, tgt_len, _ = self._record(index)
+        return Segment(index, page_start, page_end,
+                       self._source[src_off:src_off + src_len].decode('utf-8'),
+                       self._target[tgt_off:tgt_off + tgt_len].decode('utf-8'))
+
+    def by_page(self, page):
+        """返回覆盖该页（从 1 开始）的所有文本块。"""
+        if not 0 <= page < self.page_count:
+            return []
+        first, last = PAGE.unpack_from(self._index, self._pages_at + page * PAGE.size)
+        if first == NO_CHUNK:
+            return []
+        return [self.segment(i) for i in range(first, last + 1)]
+
+    def by_source_offset(self, offset):
+        """返回包含原文文件中第 offset 字节的文本块，落在分隔符上时返回前一块。"""
+        lo, hi = 0, self.chunk_count - 1
+        if hi < 0:
+            return None
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._record(mid)[2] <= offset:
+                lo = mid
+            else:
+                hi = mid - 1
+        return self.segment(lo)
+
+    def find(self, passage, limit=5):
+        """在原文中查找一段文字（忽略空白差异），返回包含它的文本块。"""
+        needle = ' '.join(passage.split()).encode('utf-8')
+        found = []
+        position = self._source.find(needle) if needle else -1
+        while position >= 0 and len(found) < limit:
+            segment = self.by_source_offset(position)
+            if not found or found[-1].index != segment.index:
+                found.append(segment)
+            position = self._source.find(needle, position + 1)
+        return found
+
+    def patch(self, index, translation):
+        """替换一个文本块的译文。新译文放得进原槽位时原地改写，否则追加到文件末尾并把旧槽位清空。
+
+        返回 True 表示原地改写，False 表示追加（阅读顺序可用 compact 恢复）。
+        """
+        if not self.writable:
+            raise ValueError("以只读方式打开，不能修改译文")
+        page_start, page_end, src_off, src_len, tgt_off, tgt_len, tgt_cap = self._record(index)
+        data = translation.encode('utf-8')
+        in_place = len(data) <= tgt_cap
+        if in_place:
+            # 剩余空间用换行填充，纯文本阅读时只是多几行空行
+            self._target_file.seek(tgt_off)
+            self._target_file.write(data + b'\n' * (tgt_cap - len(data)))
+            new_off, new_cap = tgt_off, tgt_cap
+        else:
+            self._target_file.seek(0, os.SEEK_END)
+            new_off = self._target_file.tell()
+            self._target_file.write(data + SEPARATOR)
+            new_cap = len(data)
+        self._target_file.flush()
+        os.fsync(self._target_file.fileno())
+        # 译文落盘后再更新索引记录，中途中断时索引仍指向完整的旧译文
+        RECORD.pack_into(self._index, HEADER.size + index * RECORD.size,
+                         page_start, page_end, src_off, src_len, new_off, len(data), new_cap)
+        self._index.flush()
+        if not in_place:
+            self._target_file.seek(tgt_off)
+            self._target_file.write(b'\n' * tgt_cap)
+            self._target_file.flush()
+        if isinstance(self._target, mmap.mmap):
+            self._target.close()
+        self._target = _map(self._target_file)
+        return in_place
+
+    def compact(self):
+        """按块顺序重写译文文件，去掉 patch 留下的填充和追加，返回译文文件路径。"""
+        segments = [self.segment(i) for i in range(self.chunk_count)]
+        # 标题部分的长度记录在索引头中；patch 可能已把第 0 块移到文件末尾，不能用它的偏移推算
+        header = bytes(self._target[:self.header_len])
+        self.close()
+        return write_aligned(self.translation_dir, self.name, None,
+                             [s.source for s in segments], [s.translation for s in segments], header=header)
+
+
+def print_segment(segment):
+    pages = (f"第 {segment.page_start} 页" if segment.page_start == segment.page_end
+             else f"第 {segment.page_start}-{segment.page_end} 页")
+    print(f"=== 第 {segment.index + 1} 块（{pages}）===")
+    print(segment.source)
+    print("---")
+    print(segment.translation)
+    print()
+
+
+def main(argv=None):
+    import argparse
+
+    import translator
+
+    parser = argparse.ArgumentParser(description="查找与维护双语对齐的翻译输出")
+    parser.add_argument('--dir', default=translator.TRANSLATION_DIR, help="译文目录")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    lookup = sub.add_parser('lookup', help="按块号、页码、原文偏移或原文片段查找译文")
+    lookup.add_argument('name', help="书名（PDF 文件名去掉扩展名）")
+    group = lookup.add_mutually_exclusive_group(required=True)
+    group.add_argument('--chunk', type=int, help="文本块序号（从 1 开始）")
+    group.add_argument('--page', type=int, help="源 PDF 页码")
+    group.add_argument('--offset', type=int, help="原文文件中的字节偏移")
+    group.add_argument('--find', help="原文片段")
+
+    compact = sub.add_parser('compact', help="按块顺序重写译文文件")
+    compact.add_argument('name')
+
+    legacy = sub.add_parser('import', help="把旧的【第N部分】平铺译文转为对齐格式")
+    legacy.add_argument('name')
+    legacy.add_argument('--title', help="书籍标题，默认使用书名")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        _, target_path, _ = aligned_paths(args.dir, args.name)
+        cleaned_path = Path(translator.TARGET_DIR) / f"{args.name}_cleaned.txt"
+        translations = split_flat_translation(target_path.read_text(encoding='utf-8'))
+        # 分块是确定性的：对保存的原始文本重新分块即可得到翻译时的原文块
+        chunks = translator.clean_and_chunk_text(cleaned_path.read_text(encoding='utf-8'))
+        if len(chunks) != len(translations):
+            print(f"原文 {len(chunks)} 块与译文 {len(translations)} 部分数量不一致，无法对齐")
+            return 1
+        write_aligned(args.dir, args.name, args.title or args.name, chunks, translations)
+        print(f"已转换 {len(chunks)} 块: {target_path}")
+        return 0
+
+    with AlignedTranslation(args.dir, args.name, writable=args.command == 'compact') as aligned:
+        if args.command == 'compact':
+            print(f"已重写: {aligned.compact()}")
+            return 0
+        if args.chunk is not None:
+            segments = [aligned.segment(args.chunk - 1)]
+        elif args.page is not None:
+            segments = aligned.by_page(args.page)
+        elif args.offset is not None:
+            segments = [aligned.by_source_offset(args.offset)]
+        else:
+            segments = aligned.find(args.find)
+        if not segments or segments == [None]:
+            print("没有找到对应的文本块")
+            return 1
+        for segment in segments:
+            print_segment(segment)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import hashlib
+import re
+import sqlite3
+import time
+
+# 查询时把文本块拆成句子：某个句子的词三元组有该比例以上出现在已有片段中，就把该片段的译文作为参考提示。
+# 按包含度而不是整块的 Dice 系数计分，在不同文本块中重复出现的引文、题词也能命中
+FUZZY_THRESHOLD = 0.8
+NGRAM_SIZE = 3
+# 三元组太少的句子（标题、页码、短句）容易误命中，不参与近似查找
+MIN_SENTENCE_GRAMS = 6
+MAX_CANDIDATES = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id          INTEGER PRIMARY KEY,
+    source_hash TEXT UNIQUE NOT NULL,
+    source      TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    book_title  TEXT,
+    gram_count  INTEGER NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS grams (
+    gram       TEXT NOT NULL,
+    segment_id INTEGER NOT NULL REFERENCES segments(id) ON DELETE CASCADE,
+    PRIMARY KEY (gram, segment_id)
+) WITHOUT ROWID;
+"""
+
+
+def normalize_segment(text):
+    """忽略大小写和空白差异，用于精确匹配。"""
+    return ' '.join(text.lower().split())
+
+
+def split_sentences(text):
+    """按句末标点把文本块拆成句子；引文常以 ." 结尾，句末标点后的引号、括号也算作句尾。"""
+    return [s for s in re.split(r'(?:(?<=[.!?])|(?<=[.!?]["\'”’)]))\s+', text) if s.strip()]
+
+
+def segment_grams(text, n=NGRAM_SIZE):
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < n:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+class TranslationMemory:
+    """跨书籍持久化的翻译记忆库：整块精确匹配直接复用，句子级近似匹配作为提示。
+
+    近似查找通过词三元组倒排索引完成，只对共享三元组的片段计数，不扫描全库。
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _hash(self, text):
+        return hashlib.sha256(normalize_segment(text).encode('utf-8')).hexdigest()
+
+    def lookup_exact(self, source):
+        row = self.conn.execute(
+            "SELECT translation FROM segments WHERE source_hash = ?", (self._hash(source),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def lookup_fuzzy(self, source, threshold=FUZZY_THRESHOLD, limit=MAX_CANDIDATES):
+        """返回 [(相似度, 命中的句子, 已有原文, 已有译文), ...]，按相似度从高到低排列。
+
+        source 的每个句子分别查找，相似度为该句三元组出现在已有片段中的比例；
+        同一片段被多个句子命中时只返回一次，取得分最高的句子。
+        """
+        best = {}
+        for sentence in split_sentences(source):
+            grams = segment_grams(sentence)
+            if len(grams) < MIN_SENTENCE_GRAMS:
+                continue
+            placeholders = ','.join('?' * len(grams))
+            rows = self.conn.execute(
+                f"SELECT segment_id, COUNT(*) AS shared FROM grams WHERE gram IN ({placeholders}) "
+                f"GROUP BY segment_id HAVING shared >= ? ORDER BY shared DESC LIMIT ?",
+                (*grams, threshold * len(grams), limit),
+            ).fetchall()
+            for segment_id, shared in rows:
+                score = shared / len(grams)
+                if segment_id not in best or score > best[segment_id][0]:
+                    best[segment_id] = (score, sentence)
+        matches = []
+        for segment_id, (score, sentence) in sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:limit]:
+            seg_source, translation = self.conn.execute(
+                "SELECT source, translation FROM segments WHERE id = ?", (segment_id,)
+            ).fetchone()
+            matches.append((score, sentence, seg_source, translation))
+        return matches
+
+    def add(self, source, translation, book_title=None, replace=False):
+        """写入一条译文；replace=True 时覆盖已有的同原文译文（重新翻译后修正记忆库）。"""
+        grams = segment_grams(source)
+        conflict = ("ON CONFLICT(source_hash) DO UPDATE SET translation = excluded.translation, "
+                    "book_title = excluded.book_title, created_at = excluded.created_at" if replace
+                    else "ON CONFLICT(source_hash) DO NOTHING")
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO segments (source_hash, source, translation, book_title, gram_count, created_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?) {conflict}",
+                (self._hash(source), source, translation, book_title, len(grams), time.time()),
+            )
+            if cur.rowcount and not replace:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO grams (gram, segment_id) VALUES (?, ?)",
+                    [(gram, cur.lastrowid) for gram in grams],
+                )
+            elif cur.rowcount:
+                # 覆盖时 lastrowid 不可靠，按哈希取回片段 id；原文归一化后相同，三元组不变
+                segment_id = self.conn.execute(
+                    "SELECT id FROM segments WHERE source_hash = ?", (self._hash(source),)
+                ).fetchone()[0]
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO grams (gram, segment_id) VALUES (?, ?)",
+                    [(gram, segment_id) for gram in grams],
+                )
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
@@ -1,31 +1,112 @@
 import os
-import pypdf  # 改为导入 pypdf
 import re
-from openai import OpenAI
 import time
 import json
+import sys
 from pathlib import Path
 
-# 配置路径
-SOURCE_DIR = "/workspaces/xiaoqizhangxz-arch.github.io/translator/source_pdfs"
-TARGET_DIR = "/workspaces/xiaoqizhangxz-arch.github.io/translator/cleaned_txts"
-TRANSLATION_DIR = "/workspaces/xiaoqizhangxz-arch.github.io/translator/translations"
-LOG_DIR = "/workspaces/xiaoqizhangxz-arch.github.io/translator/logs"
+# 与 paperbot 共用扫描页 OCR 回退与路径配置
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "my-project"))
+import ocr_fallback
+import prompt_cache
+import usage_ledger
+from paths import TRANSLATOR_DIR
+from translation_memory import TranslationMemory, normalize_segment
+import aligned_output
 
-# 创建必要的目录
-for directory in [SOURCE_DIR, TARGET_DIR, TRANSLATION_DIR, LOG_DIR]:
-    Path(directory).mkdir(parents=True, exist_ok=True)
+# 配置路径（站点根目录可由 PAPERBOT_BASE_DIR 覆盖，翻译目录可由 TRANSLATOR_DIR 单独覆盖）
+SOURCE_DIR = str(TRANSLATOR_DIR / 'source_pdfs')
+TARGET_DIR = str(TRANSLATOR_DIR / 'cleaned_txts')
+TRANSLATION_DIR = str(TRANSLATOR_DIR / 'translations')
+LOG_DIR = str(TRANSLATOR_DIR / 'logs')
+# 跨书籍共享的翻译记忆库
+TM_PATH = str(TRANSLATOR_DIR / 'translation_memory.sqlite3')
+# 每个翻译请求最多附带的翻译记忆提示条数
+MAX_PROMPT_HINTS = 3
+
+
+def ensure_dirs():
+    """创建必要的目录；在真正开始翻译时调用，导入本模块不会产生副作用。"""
+    for directory in [SOURCE_DIR, TARGET_DIR, TRANSLATION_DIR, LOG_DIR]:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+
+def clean_and_chunk_text(text, chunk_size=1500):
+    """清理文本并分块。分块是确定性的，对保存的原始文本重新分块可得到翻译时的原文块。"""
+    print("正在进行文本清理和分块...")
+
+    # 基础清理
+    text = re.sub(r'\s+', ' ', text)  # 合并多余空白字符
+    text = re.sub(r'\n\s*\n', '\n\n', text)  # 规范化段落间隔
+
+    # 按语义分块（句子、段落）
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+
+    chunks = []
+    current_chunk = ""
+
+    for sentence in sentences:
+        # 如果当前块加上新句子不超过限制，则添加
+        if len(current_chunk) + len(sentence) <= chunk_size:
+            if current_chunk:
+                current_chunk += " " + sentence
+            else:
+                current_chunk = sentence
+        else:
+            # 如果当前块已经有内容，保存它
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+                current_chunk = sentence
+            else:
+                # 如果单个句子就超过chunk_size，强制分割
+                chunks.append(sentence[:chunk_size])
+                current_chunk = sentence[chunk_size:]
+
+    # 添加最后一个块
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+
+    print(f"文本已分成 {len(chunks)} 个块")
+    return chunks
+
+
+# 系统提示词在所有请求中保持不变，作为可被服务端缓存的静态前缀
+TRANSLATION_SYSTEM_PROMPT = """你是一位专业的翻译专家，专门从事心理学和神秘学文献的翻译。请遵循以下要求：
+
+专业术语一致性：
+- 荣格心理学：集体无意识、原型、阴影、人格面具、自性化、阿尼玛、阿尼姆斯等
+- 塔罗牌：大阿卡纳、小阿卡纳、愚者、魔术师、女祭司、皇后、皇帝等
+- 保持学术严谨性，专业术语前后统一
+
+翻译风格：
+- 学术性但不过于晦涩
+- 保持原文的哲学深度和象征意义
+- 文化概念要准确传达，必要时添加简要说明
+- 语言流畅自然，符合中文表达习惯
+
+注意事项：
+- 保留重要的专业术语英文原文（首次出现时用括号标注）
+- 保持段落结构和逻辑连贯性
+- 特别注意象征性语言和隐喻的准确传达"""
 
 class PDFTranslator:
     def __init__(self, api_key):
+        # SDK 按需导入，只有真正翻译时才付出加载开销
+        from openai import OpenAI
+
+        ensure_dirs()
         self.client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
         self.terminology_dict = {}
         self.translation_log = []
+        self.cache_stats = prompt_cache.CacheStats("DeepSeek 翻译")
+        self.memory = TranslationMemory(TM_PATH)
+        self.ledger = usage_ledger.UsageLedger()
         
     def extract_pdf_text(self, pdf_path):
         """提取PDF文本内容"""
         print(f"正在提取PDF文本: {pdf_path}")
-        full_text = ""
+        page_texts = []
+        import pypdf
         
         try:
             with open(pdf_path, 'rb') as file:
@@ -33,54 +114,26 @@ class PDFTranslator:
                 total_pages = len(reader.pages)
                 
                 for page_num, page in enumerate(reader.pages):
-                    text = page.extract_text()
-                    # 添加页码标记
-                    full_text += f"--- Page {page_num + 1} ---\n{text}\n\n"
+                    page_texts.append(page.extract_text() or "")
                     print(f"已提取第 {page_num + 1}/{total_pages} 页")
                     
         except Exception as e:
             print(f"PDF提取错误: {e}")
             raise
         
+        # 扫描页（每页字符过少）交给OCR，结果按页缓存
+        page_texts = ocr_fallback.fill_scanned_pages(pdf_path, page_texts)
+        
+        full_text = ""
+        for page_num, text in enumerate(page_texts):
+            # 添加页码标记
+            full_text += f"--- Page {page_num + 1} ---\n{text}\n\n"
+        
         return full_text
     
     def clean_and_chunk_text(self, text, chunk_size=1500):
         """清理文本并分块"""
-        print("正在进行文本清理和分块...")
-        
-        # 基础清理
-        text = re.sub(r'\s+', ' ', text)  # 合并多余空白字符
-        text = re.sub(r'\n\s*\n', '\n\n', text)  # 规范化段落间隔
-        
-        # 按语义分块（句子、段落）
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        
-        chunks = []
-        current_chunk = ""
-        
-        for sentence in sentences:
-            # 如果当前块加上新句子不超过限制，则添加
-            if len(current_chunk) + len(sentence) <= chunk_size:
-                if current_chunk:
-                    current_chunk += " " + sentence
-                else:
-                    current_chunk = sentence
-            else:
-                # 如果当前块已经有内容，保存它
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = sentence
-                else:
-                    # 如果单个句子就超过chunk_size，强制分割
-                    chunks.append(sentence[:chunk_size])
-                    current_chunk = sentence[chunk_size:]
-        
-        # 添加最后一个块
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-        
-        print(f"文本已分成 {len(chunks)} 个块")
-        return chunks
+        return clean_and_chunk_text(text, chunk_size)
     
     def save_cleaned_text(self, text, original_filename):
         """保存清理后的文本"""
@@ -91,55 +144,80 @@ class PDFTranslator:
         return output_path
     
     def build_system_prompt(self):
-        """构建系统提示词"""
-        return """你是一位专业的翻译专家，专门从事心理学和神秘学文献的翻译。请遵循以下要求：
-
-专业术语一致性：
-- 荣格心理学：集体无意识、原型、阴影、人格面具、自性化、阿尼玛、阿尼姆斯等
-- 塔罗牌：大阿卡纳、小阿卡纳、愚者、魔术师、女祭司、皇后、皇帝等
-- 保持学术严谨性，专业术语前后统一
-
-翻译风格：
-- 学术性但不过于晦涩
-- 保持原文的哲学深度和象征意义
-- 文化概念要准确传达，必要时添加简要说明
-- 语言流畅自然，符合中文表达习惯
-
-注意事项：
-- 保留重要的专业术语英文原文（首次出现时用括号标注）
-- 保持段落结构和逻辑连贯性
-- 特别注意象征性语言和隐喻的准确传达"""
+        """构建系统提示词（模块常量，保证每次请求的前缀逐字节一致以命中DeepSeek上下文缓存）"""
+        return TRANSLATION_SYSTEM_PROMPT
     
-    def translate_text_chunks(self, chunks, book_title):
-        """翻译文本块"""
+    def translate_text_chunks(self, chunks, book_title, use_memory=True):
+        """翻译文本块。use_memory=False 时不复用翻译记忆中的原有译文（用于重新翻译），新译文会替换记忆中的旧译文"""
         print(f"开始翻译《{book_title}》，共 {len(chunks)} 个文本块...")
         
         translations = []
         messages = [{"role": "system", "content": self.build_system_prompt()}]
+        memory_hits = 0
         
         for i, chunk in enumerate(chunks):
             print(f"翻译进度: {i+1}/{len(chunks)}")
             
             try:
+                # 翻译记忆精确命中：直接复用，不调用API
+                remembered = self.memory.lookup_exact(chunk) if use_memory else None
+                if remembered is not None:
+                    print("翻译记忆精确命中，跳过API调用")
+                    memory_hits += 1
+                    translations.append(remembered)
+                    self.translation_log.append({
+                        "chunk_index": i,
+                        "original_length": len(chunk),
+                        "translation_length": len(remembered),
+                        "source": "translation_memory",
+                        "timestamp": time.time()
+                    })
+                    messages.append({"role": "user", "content": self.build_translation_prompt(chunk, i, len(chunks), book_title)})
+                    messages = self.manage_conversation_history(messages, remembered)
+                    continue
+                
+                # 近似命中的译文作为参考提示
+                fuzzy_matches = self.memory.lookup_fuzzy(chunk)
+                if not use_memory:
+                    # 重新翻译时不能把要替换的旧译文本身当作参考
+                    fuzzy_matches = [m for m in fuzzy_matches
+                                     if normalize_segment(m[2]) != normalize_segment(chunk)]
+                
                 # 构建用户提示
-                user_prompt = self.build_translation_prompt(chunk, i, len(chunks), book_title)
+                user_prompt = self.build_translation_prompt(chunk, i, len(chunks), book_title, fuzzy_matches)
                 messages.append({"role": "user", "content": user_prompt})
                 
+                start = time.monotonic()
                 response = self.client.chat.completions.create(
                     model="deepseek-chat",
                     messages=messages,
                     temperature=0.2,
                     max_tokens=4000
                 )
+                seconds = time.monotonic() - start
                 
                 translation = response.choices[0].message.content
                 translations.append(translation)
+                self.memory.add(chunk, translation, book_title, replace=not use_memory)
+                
+                # DeepSeek 在 usage 中返回前缀缓存命中的 token 数
+                prompt_tokens, cache_hit_tokens, completion_tokens = usage_ledger.deepseek_usage(
+                    getattr(response, "usage", None))
+                self.cache_stats.record(prompt_tokens, cache_hit_tokens)
+                cost = self.ledger.record('book', book_title, 'deepseek', "deepseek-chat", 'translate',
+                                          prompt_tokens, cache_hit_tokens, completion_tokens, seconds)
                 
                 # 记录日志
                 self.translation_log.append({
                     "chunk_index": i,
                     "original_length": len(chunk),
                     "translation_length": len(translation),
+                    "prompt_tokens": prompt_tokens,
+                    "prompt_cache_hit_tokens": cache_hit_tokens,
+                    "completion_tokens": completion_tokens,
+                    "seconds": round(seconds, 2),
+                    "cost_usd": round(cost, 6),
+                    "fuzzy_hints": len(fuzzy_matches),
                     "timestamp": time.time()
                 })
                 
@@ -164,9 +242,14 @@ class PDFTranslator:
                 time.sleep(10)  # 错误后等待更长时间
                 continue
         
+        print(self.cache_stats.summary())
+        print(f"翻译记忆: 复用 {memory_hits}/{len(chunks)} 个文本块，记忆库共 {len(self.memory)} 条")
+        total = self.ledger.totals(batch_id=self.ledger.batch_id, scope='book', subject=book_title)
+        rate = total['output'] / total['seconds'] if total['seconds'] else 0.0
+        print(f"《{book_title}》: 输出 {total['output']} tokens，{rate:.1f} tokens/s，估算费用 ${total['cost']:.4f}")
         return translations
     
-    def build_translation_prompt(self, chunk, current_index, total_chunks, book_title):
+    def build_translation_prompt(self, chunk, current_index, total_chunks, book_title, fuzzy_matches=None):
         """构建翻译提示"""
         context_info = []
         
@@ -180,11 +263,18 @@ class PDFTranslator:
         
         context_str = "。".join(context_info)
         
+        hints_str = ""
+        if fuzzy_matches:
+            # 每个命中的已有片段单独作为一条提示，并指出当前片段中与之重合的句子
+            hints = [f"（相似度 {score:.0%}）\n当前片段中的句子：{sentence}\n已译原文：{source}\n已有译文：{translation}"
+                     for score, sentence, source, translation in fuzzy_matches[:MAX_PROMPT_HINTS]]
+            hints_str = "以下是翻译记忆中包含相同语句的片段，相同内容（如引文、题词）请沿用其译法：\n" + "\n\n".join(hints) + "\n\n"
+        
         return f"""《{book_title}》翻译任务
 
 {context_str}
 
-当前翻译片段（第{current_index + 1}/{total_chunks}部分）：
+{hints_str}当前翻译片段（第{current_index + 1}/{total_chunks}部分）：
 {chunk}
 
 请提供专业准确的中文翻译，保持学术严谨性和语言流畅性："""
@@ -232,20 +322,11 @@ class PDFTranslator:
                         self.terminology_dict[term] = explanation
                         print(f"发现新术语: {term} -> {explanation}")
     
-    def save_translation(self, translations, original_filename, book_title):
-        """保存翻译结果"""
-        # 保存完整翻译
-        output_path = os.path.join(TRANSLATION_DIR, f"{original_filename}_translated.txt")
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(f"《{book_title}》中文翻译\n")
-            f.write("=" * 50 + "\n\n")
-            
-            for i, translation in enumerate(translations):
-                f.write(f"【第{i+1}部分】\n")
-                f.write(translation)
-                f.write("\n\n" + "-" * 40 + "\n\n")
-        
-        print(f"完整翻译已保存: {output_path}")
+    def save_translation(self, chunks, translations, original_filename, book_title):
+        """保存翻译结果：原文、译文与对齐索引，可按块号、页码或原文片段查找对应译文"""
+        output_path = str(aligned_output.write_aligned(TRANSLATION_DIR, original_filename, book_title,
+                                                       chunks, translations))
+        print(f"完整翻译已保存: {output_path}（对齐索引: {original_filename}_aligned.idx）")
         
         # 保存术语表
         if self.terminology_dict:
@@ -292,7 +373,7 @@ class PDFTranslator:
             translations = self.translate_text_chunks(chunks, book_title)
             
             # 步骤5: 保存结果
-            final_path = self.save_translation(translations, original_name, book_title)
+            final_path = self.save_translation(chunks, translations, original_name, book_title)
             
             print(f"处理完成: {book_title}")
             print(f"清理文本: {cleaned_path}")
@@ -304,6 +385,38 @@ class PDFTranslator:
             print(f"处理失败 {pdf_filename}: {e}")
             return None
     
+    def retranslate_chunks(self, pdf_filename, book_title=None, chunk_indices=None):
+        """重新翻译已保存译文中的个别文本块（序号从 0 开始），直接改写对齐输出中的对应字节。
+
+        不指定 chunk_indices 时重新翻译所有以“[翻译错误”开头的块。返回重新翻译的块数。
+        """
+        original_name = os.path.splitext(pdf_filename)[0]
+        if book_title is None:
+            book_title = original_name
+        
+        with aligned_output.AlignedTranslation(TRANSLATION_DIR, original_name, writable=True) as aligned:
+            if chunk_indices is None:
+                chunk_indices = [i for i in range(len(aligned))
+                                 if aligned.segment(i).translation.startswith("[翻译错误")]
+            if not chunk_indices:
+                print(f"《{book_title}》没有需要重新翻译的文本块")
+                return 0
+            
+            appended = 0
+            for i in chunk_indices:
+                segment = aligned.segment(i)
+                print(f"重新翻译第 {i + 1}/{len(aligned)} 块（第 {segment.page_start} 页）")
+                translation = self.translate_text_chunks([segment.source], book_title, use_memory=False)[0]
+                if translation.startswith("[翻译错误"):
+                    print(f"第 {i + 1} 块仍然翻译失败，保留原译文")
+                    continue
+                if not aligned.patch(i, translation):
+                    appended += 1
+            if appended:
+                print(f"{appended} 块的新译文比原槽位长，已追加到文件末尾；"
+                      f"可运行 python aligned_output.py compact \"{original_name}\" 恢复阅读顺序")
+        return len(chunk_indices)
+    
     def batch_process_pdfs(self):
         """批量处理SOURCE_DIR中的所有PDF文件"""
         pdf_files = [f for f in os.listdir(SOURCE_DIR) if f.lower().endswith('.pdf')]
@@ -317,6 +430,10 @@ class PDFTranslator:
             print(f"{i+1}. {pdf_file}")
         
         for pdf_file in pdf_files:
+            # DeepSeek 没有更便宜的档位可切换，只在策略为 stop 时按批次预算停止
+            if self.ledger.should_stop():
+                print(f"\n[预算] 本批次估算费用 ${self.ledger.batch_cost():.4f} 已达上限，其余文件留待下次处理")
+                break
             print(f"\n{'='*50}")
             print(f"处理文件: {pdf_file}")
             print('='*50)
@@ -326,6 +443,8 @@ class PDFTranslator:
             print(f"完成: {pdf_file}")
             print("等待10秒后处理下一个文件...")
             time.sleep(10)
+        
+        print(self.ledger.report(self.ledger.batch_id))
 
 def main():
     # 从环境变量获取API密钥
@@ -338,6 +457,19 @@ def main():
     # 创建翻译器实例
     translator = PDFTranslator(api_key)
     
+    # 非交互模式: python translator.py <PDF文件名> [书籍标题]，或 --batch 批量处理，
+    # 或 --retranslate <PDF文件名> [块序号...] 重新翻译个别文本块（序号从 1 开始，省略时为翻译失败的块）
+    if len(sys.argv) > 1:
+        if sys.argv[1] == "--batch":
+            translator.batch_process_pdfs()
+        elif sys.argv[1] == "--retranslate" and len(sys.argv) > 2:
+            indices = [int(n) - 1 for n in sys.argv[3:]] or None
+            translator.retranslate_chunks(sys.argv[2], chunk_indices=indices)
+        else:
+            book_title = sys.argv[2] if len(sys.argv) > 2 else None
+            translator.process_pdf_file(sys.argv[1], book_title)
+        return
+    
     # 选择处理模式
     print("选择处理模式:")
     print("1. 处理单个PDF文件")
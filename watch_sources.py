@@ -0,0 +1,152 @@
+# watch_sources.py
+"""
+长时间运行的监视模式：发现 source_pdfs/ 与 translator/source_pdfs/ 中新增或变化的 PDF，
+只为这些文件添加任务；任务完成后把输入文件移到对应的 finished_pdfs/。
+
+    python watch_sources.py                 # 只负责入队，另行运行 job_queue.py work
+    python watch_sources.py --workers 2     # 同时启动 worker 进程
+
+采用轮询 + 去抖：文件的大小和修改时间在 DEBOUNCE_SECONDS 内保持不变才视为写入完成，
+再用内容哈希判断是否真的变化。
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import time
+from pathlib import Path
+
+import job_queue
+# job_queue 导入时已把 my-project/ 加入 sys.path；目录规则与 paperbot、translator 相同
+from artifact_store import file_sha256
+from paths import BASE_DIR, TRANSLATOR_DIR
+
+# --- 配置 ---
+POLL_INTERVAL = float(os.environ.get('WATCH_POLL_INTERVAL', '5'))
+DEBOUNCE_SECONDS = float(os.environ.get('WATCH_DEBOUNCE_SECONDS', '10'))
+
+# 监视的目录 -> (任务类型, 完成后移动到的目录)
+WATCHED_DIRS = {
+    BASE_DIR / 'source_pdfs': ('summarise', BASE_DIR / 'finished_pdfs'),
+    TRANSLATOR_DIR / 'source_pdfs': ('translate', TRANSLATOR_DIR / 'finished_pdfs'),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watched_files (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256   TEXT NOT NULL,
+    job_id   INTEGER
+);
+"""
+
+
+def scan(folder):
+    """返回 {路径: (大小, 修改时间)}，忽略 macOS 的 ._ 文件。"""
+    found = {}
+    if not folder.is_dir():
+        return found
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith('.pdf') and not entry.name.startswith('._'):
+                st = entry.stat()
+                found[Path(entry.path)] = (st.st_size, st.st_mtime_ns)
+    return found
+
+
+class SourceWatcher:
+    def __init__(self, conn):
+        self.conn = conn
+        self.conn.executescript(SCHEMA)
+        # 路径 -> (最近一次观察到的状态, 该状态首次出现的时间)
+        self.observed = {}
+
+    def _enqueue_if_changed(self, path, stat, kind):
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, sha256 FROM watched_files WHERE path = ?", (str(path),)
+        ).fetchone()
+        if row and (row[0], row[1]) == stat:
+            return
+        sha256 = file_sha256(path)
+        if row and row[2] == sha256:
+            # 只是被 touch 过，内容未变
+            self.conn.execute(
+                "UPDATE watched_files SET size = ?, mtime_ns = ? WHERE path = ?", (*stat, str(path))
+            )
+            return
+        # translator 以其 SOURCE_DIR 为基准解析文件名
+        payload = {'pdf': str(path)} if kind == 'summarise' else {'pdf': path.name, 'title': None}
+        job_id = job_queue.enqueue(self.conn, kind, payload)
+        self.conn.execute(
+            "INSERT INTO watched_files (path, size, mtime_ns, sha256, job_id) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+            "sha256 = excluded.sha256, job_id = excluded.job_id",
+            (str(path), *stat, sha256, job_id),
+        )
+        print(f"[watch] 发现{'新' if row is None else '变化的'}文件，已添加任务 #{job_id} {kind}: {path.name}")
+
+    def poll(self):
+        now = time.monotonic()
+        seen = set()
+        for folder, (kind, _) in WATCHED_DIRS.items():
+            for path, stat in scan(folder).items():
+                seen.add(path)
+                previous = self.observed.get(path)
+                if previous is None or previous[0] != stat:
+                    self.observed[path] = (stat, now)
+                    continue
+                if now - previous[1] >= DEBOUNCE_SECONDS:
+                    self._enqueue_if_changed(path, stat, kind)
+        for path in list(self.observed):
+            if path not in seen:
+                del self.observed[path]
+        self.move_finished()
+
+    def move_finished(self):
+        """把任务已完成的输入文件移到 finished_pdfs/。"""
+        rows = self.conn.execute(
+            "SELECT w.path, w.sha256 FROM watched_files w JOIN jobs j ON j.id = w.job_id WHERE j.status = 'done'"
+        ).fetchall()
+        for path_str, sha256 in rows:
+            path = Path(path_str)
+            target_dir = WATCHED_DIRS.get(path.parent, (None, None))[1]
+            if target_dir is None or not path.exists():
+                self.conn.execute("DELETE FROM watched_files WHERE path = ?", (path_str,))
+                continue
+            # 任务完成后文件又被替换，则保留给下一轮处理
+            if file_sha256(path) != sha256:
+                continue
+            target_dir.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(path), str(target_dir / path.name))
+            self.conn.execute("DELETE FROM watched_files WHERE path = ?", (path_str,))
+            self.observed.pop(path, None)
+            print(f"[watch] 已完成，移至 {target_dir.name}/: {path.name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监视 source_pdfs 并自动添加任务")
+    parser.add_argument('--workers', type=int, default=0, help="同时启动的 worker 进程数（默认 0，只入队）")
+    args = parser.parse_args()
+
+    worker_process = None
+    if args.workers:
+        worker_process = multiprocessing.Process(target=job_queue.run_workers, args=(args.workers,))
+        worker_process.start()
+
+    watcher = SourceWatcher(job_queue.connect())
+    print(f"[watch] 正在监视: {', '.join(str(d) for d in WATCHED_DIRS)}（每 {POLL_INTERVAL:g}s 轮询）")
+    try:
+        while True:
+            watcher.poll()
+            time.sleep(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print("\n[watch] 已停止")
+    finally:
+        if worker_process is not None:
+            worker_process.terminate()
+            worker_process.join()
+
+
+if __name__ == "__main__":
+    main()